@@ -1,24 +1,81 @@
-import operator
+import cairo
+import heapq
 from math import cos, pi, sin
-from core import Chart, BarChart, Axis
+from core import Chart, BarChart, Axis, FillBatch, Points, numpy, setRenderWorkers
+import sampling
+import streams
+from cache import DiskCache, LayerCache, RenderCache, SurfacePool, TextCache
+from batch import BatchError, buildChart, iterRenderMany, renderMany
+from executor import CancelledError, RenderExecutor, RenderFuture, RenderTimeout
+from profiling import Profiler, RenderStats
+from grid import renderGrid
+from tiles import renderTiled, renderTiledTo
+from wsgi import ChartApplication
 import os
 
 class PieChart(Chart):
 	total = 0
 	percent = 0
+	sliceLimit = None
+	sliceMinPercent = None
+	otherLabel = 'Other'
+	extrusion = 'discs'
 
-	def computePercent(self):
-		self.total = 0
-		self.percent = []
-		for point in self.points:
-			self.total += point[1]
-		for point in self.points:
-			if self.total == 0:
-				percent = 0
+	def setExtrusion(self, extrusion):
+		self.extrusion = extrusion
+
+	def setTopSlices(self, limit = None, minPercent = None, otherLabel = 'Other'):
+		self.sliceLimit = limit
+		self.sliceMinPercent = minPercent
+		self.otherLabel = otherLabel
+
+	def streamReducer(self):
+		if self.sliceLimit is None:
+			return None
+		return streams.TopValues(self.sliceLimit)
+
+	def percentOf(self, value):
+		if self.total == 0:
+			return 0
+		return 100 * (value / float(self.total))
+
+	def computeTopSlices(self, values):
+		if self.sliceMinPercent is not None and self.total:
+			threshold = self.sliceMinPercent * self.total / 100.0
+			if numpy is not None:
+				indices = numpy.nonzero(values >= threshold)[0]
 			else:
-				percent = 100 * (point[1] / float(self.total))
-			self.percent.append((percent, point))
-		self.percent = sorted(self.percent, key = operator.itemgetter(0), reverse = True)
+				indices = [i for i in range(len(values)) if values[i] >= threshold]
+		else:
+			indices = range(len(values))
+		limit = len(indices) if self.sliceLimit is None else self.sliceLimit
+		top = heapq.nlargest(limit, indices, key = values.__getitem__)
+		percent = [(self.percentOf(values[i]), self.points[i]) for i in top]
+		if len(top) < self.points.count():
+			rest = self.total - sum(values[i] for i in top)
+			percent.append((self.percentOf(rest), (self.otherLabel, rest)))
+		return percent
+
+	def prepareData(self):
+		self.computePercent()
+
+	def computePercent(self):
+		if self.frozenData:
+			return
+		self.total = self.points.total()
+		values = self.points.valueArray()
+		if self.sliceLimit is not None or self.sliceMinPercent is not None:
+			self.percent = self.computeTopSlices(values)
+			return
+		if self.total == 0:
+			percents = [0] * len(values)
+		else:
+			percents = 100 * values / float(self.total) if numpy is not None else [100 * (value / float(self.total)) for value in values]
+		if numpy is not None:
+			order = numpy.argsort(-numpy.asarray(percents, dtype = 'd'), kind = 'mergesort')
+		else:
+			order = sorted(range(len(values)), key = percents.__getitem__, reverse = True)
+		self.percent = [(percents[i], self.points[i]) for i in order]
 
 	def computeLabels(self):
 		labels = []
@@ -51,29 +108,72 @@ class PieChart(Chart):
 		self.ctx.set_source_rgb(*color)
 		self.ctx.fill()
 
-	def drawDisc(self, cy, colorArray, alpha = 0):
+	def computeSlices(self):
+		self.slices = []
 		i = 0
 		angle1 = 0
 		percentTotal = 0
-		mtx = self.ctx.get_matrix()
-		self.ctx.translate(self.pieCenterX, self.pieCenterY - cy)
-		self.ctx.scale(1.0, float(self.pieHeight) / float(self.pieWidth))
+		radius = self.pieWidth / 2
 		for a in self.percent:
 			(percent, point) = a
-			color = colorArray[i % len(colorArray)]
-			if alpha:
-				rDiff = self.backgroundColor[0] - color[0]
-				gDiff = self.backgroundColor[1] - color[1]
-				bDiff = self.backgroundColor[2] - color[2]
-				color = (color[0] + rDiff * alpha, color[1] + gDiff * alpha, color[2] + bDiff * alpha)
 			i += 1
 			percentTotal += percent
-			if i == len(self.percent) or self.percent[i] == 0:
+			if i == len(self.percent):
 				percentTotal = 100
 			angle2 = percentTotal / 50.0 * pi
 			if percent > 0:
-				self.drawPieslice(0, 0, self.pieWidth / 2, angle1, angle2, color)
+				self.ctx.new_path()
+				self.ctx.move_to(0, 0)
+				self.ctx.arc(0, 0, radius, angle1, angle2)
+				self.ctx.line_to(0, 0)
+				self.slices.append((angle1, angle2, i - 1, self.ctx.copy_path()))
+				self.ctx.new_path()
 			angle1 = angle2
+
+	def blendColor(self, color, alpha):
+		rDiff = self.backgroundColor[0] - color[0]
+		gDiff = self.backgroundColor[1] - color[1]
+		bDiff = self.backgroundColor[2] - color[2]
+		return (color[0] + rDiff * alpha, color[1] + gDiff * alpha, color[2] + bDiff * alpha)
+
+	def drawDisc(self, cy, colorArray, alpha = 0):
+		mtx = self.ctx.get_matrix()
+		self.ctx.translate(self.pieCenterX, self.pieCenterY - cy)
+		self.ctx.scale(1.0, float(self.pieHeight) / float(self.pieWidth))
+		for (angle1, angle2, index, path) in self.slices:
+			color = colorArray[index % len(colorArray)]
+			if alpha:
+				color = self.blendColor(color, alpha)
+			self.ctx.append_path(path)
+			self.ctx.set_source_rgb(*color)
+			self.ctx.fill()
+		self.ctx.set_matrix(mtx)
+
+	def drawBand(self, bottom, top, colorArray, alphaBottom = 0, alphaTop = 0):
+		mtx = self.ctx.get_matrix()
+		ratio = float(self.pieHeight) / float(self.pieWidth)
+		self.ctx.translate(self.pieCenterX, self.pieCenterY - bottom)
+		self.ctx.scale(1.0, ratio)
+		radius = self.pieWidth / 2
+		offset = (top - bottom) / ratio
+		for (angle1, angle2, index, path) in self.slices:
+			band1 = max(angle1, 0)
+			band2 = min(angle2, pi)
+			if band1 >= band2:
+				continue
+			self.ctx.arc(0, 0, radius, band1, band2)
+			self.ctx.line_to(radius * cos(band2), radius * sin(band2) - offset)
+			self.ctx.arc_negative(0, -offset, radius, band2, band1)
+			self.ctx.close_path()
+			color = colorArray[index % len(colorArray)]
+			if alphaBottom or alphaTop:
+				gradient = cairo.LinearGradient(0, radius, 0, radius - offset)
+				gradient.add_color_stop_rgba(0, *(self.blendColor(color, alphaBottom) + (1,)))
+				gradient.add_color_stop_rgba(1, *(self.blendColor(color, alphaTop) + (1,)))
+				self.ctx.set_source(gradient)
+			else:
+				self.ctx.set_source_rgb(*color)
+			self.ctx.fill()
 		self.ctx.set_matrix(mtx)
 
 	def drawPercent(self):
@@ -85,19 +185,27 @@ class PieChart(Chart):
 				continue
 			percentTotal += percent
 			angle2 = percentTotal * 2 * pi / 100
-			angle = angle1 + (angle2 - angle1) / 2
-			text = '%.1d%%' % percent
-			x = cos(angle) * (self.pieWidth + 3 * self.text.fontSize) / 2 + self.pieCenterX
-			y = sin(angle) * (self.pieHeight + 3 * self.text.fontSize) / 2 + self.pieCenterY - self.graphDepth * 0.5
-			self.text.printText(self.ctx, (int(x), int(y)), self.textColor, text, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
+			if (angle2 - angle1) * (self.pieHeight + 3 * self.text.fontSize) / 2 >= self.text.fontSize:
+				angle = angle1 + (angle2 - angle1) / 2
+				text = '%.1d%%' % percent
+				x = cos(angle) * (self.pieWidth + 3 * self.text.fontSize) / 2 + self.pieCenterX
+				y = sin(angle) * (self.pieHeight + 3 * self.text.fontSize) / 2 + self.pieCenterY - self.graphDepth * 0.5
+				self.text.printText(self.ctx, (int(x), int(y)), self.textColor, text, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
 			angle1 = angle2
 
 	def printPie(self):
 		if self.points and self.percent[0][0]:
-			for cy in range(self.graphDepth - 1):
-				self.drawDisc(- self.graphDepth + cy, self.shadowPalette, alpha = 1.00 - (0.5 * cy / float(self.graphDepth)))
-			for cy in range(self.graphDepth):
-				self.drawDisc(cy, self.shadowPalette)
+			self.computeSlices()
+			if self.extrusion == 'band':
+				if self.graphDepth > 1:
+					self.drawBand(- self.graphDepth, 0, self.shadowPalette, alphaBottom = 1.00, alphaTop = 1.00 - (0.5 * (self.graphDepth - 2) / float(self.graphDepth)))
+				if self.graphDepth > 0:
+					self.drawBand(0, self.graphDepth, self.shadowPalette)
+			else:
+				for cy in range(self.graphDepth - 1):
+					self.drawDisc(- self.graphDepth + cy, self.shadowPalette, alpha = 1.00 - (0.5 * cy / float(self.graphDepth)))
+				for cy in range(self.graphDepth):
+					self.drawDisc(cy, self.shadowPalette)
 			self.drawDisc(self.graphDepth, self.palette)
 			self.drawPercent()
 		else:
@@ -106,38 +214,35 @@ class PieChart(Chart):
 	def draw(self):
 		self.computeLabelMargin()
 		self.computePercent()
-		self.createImage()
-		self.printTitle()
+		self.printStatic()
 		self.printPie()
-		self.printLabel()
+		self.printLegend()
 
 class VerticalChart(BarChart):
 	def printAxis(self):
 		if not self.sampleCount:
 			return
+		ticks = FillBatch()
 		minValue = self.axis.displayMin
 		maxValue = self.axis.displayMax
 		stepValue = self.axis.tics
 		value = minValue
 		while value <= maxValue:
 			y = int(self.graphBRY - (value - minValue) * self.graphHeight / self.axis.displayDelta)
-			self.ctx.set_source_rgb(*self.textColor)
-			self.ctx.rectangle(self.graphTLX - 3, y, 1, 1)
-			self.ctx.fill()
-			self.ctx.rectangle(self.graphTLX - 1, y, 1, 1)
-			self.ctx.fill()
+			ticks.rectangle(self.textColor, self.graphTLX - 3, y, 1, 1)
+			ticks.rectangle(self.textColor, self.graphTLX - 1, y, 1, 1)
 			self.text.printText(self.ctx, (self.graphTLX - 5, y), self.textColor, '%u' % value, self.text.HORIZONTAL_RIGHT_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
 			value += stepValue
 		columnWidth = self.graphWidth / self.sampleCount
-		i = 0
-		for point in self.points:
+		lastX = None
+		for i in range(self.sampleCount):
 			x = int(self.graphTLX + i * columnWidth)
-			self.ctx.set_source_rgb(*self.textColor)
-			self.ctx.rectangle(x, self.graphBRY + 3, 1, 1)
-			self.ctx.fill()
-			self.ctx.rectangle(x, self.graphBRY + 1, 1, 1)
-			self.ctx.fill()
-			i += 1
+			if x == lastX:
+				continue
+			lastX = x
+			ticks.rectangle(self.textColor, x, self.graphBRY + 3, 1, 1)
+			ticks.rectangle(self.textColor, x, self.graphBRY + 1, 1, 1)
+		self.fillBatch(ticks)
 
 	def computeLabelMargin(self):
 		self.axis = Axis(self.yMinValue, self.yMaxValue)
@@ -160,80 +265,89 @@ class VerticalChart(BarChart):
 		stepValue = self.axis.tics
 		columnWidth = int(self.graphWidth / self.sampleCount)
 		i = 0
+		bars = FillBatch()
+		shadows = FillBatch()
+		reflections = FillBatch()
+		self.gradients = {}
 		for point in self.points:
 			x = self.graphTLX + i * columnWidth
 			value = point[1]
 			ymin = int((value - minValue) * self.graphHeight / self.axis.displayDelta)
-			self.text.printText(self.ctx, (x + columnWidth * 0.5, self.graphBRY - ymin - self.text.fontSize * 0.5), self.textColor, '%u' % value, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_BOTTOM_ALIGN)
+			label = '%u' % value
+			if self.text.textWidth(label) <= columnWidth:
+				self.text.printText(self.ctx, (x + columnWidth * 0.5, self.graphBRY - ymin - self.text.fontSize * 0.5), self.textColor, label, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_BOTTOM_ALIGN)
 			x1 = x + self.text.fontSize * 0.5
 			x2 = columnWidth - self.text.fontSize
+			if x2 <= 0:
+				i += 1
+				continue
 			color = self.palette[i % len(self.palette)]
-			self.ctx.set_source_rgb(*color)
-			self.ctx.rectangle(x1, self.graphBRY - ymin, x2, ymin)
-			self.ctx.fill()
+			bars.rectangle(color, x1, self.graphBRY - ymin, x2, ymin)
+			lines = min(self.graphDepth, ymin) - 1
 			if x2 > 2 * self.graphDepth:
 				shadow = self.shadowPalette[i % len(self.palette)]
-				self.ctx.set_source_rgb(*shadow)
-				self.ctx.rectangle(x1 + x2 - self.graphDepth, self.graphBRY - ymin, self.graphDepth, ymin)
-				self.ctx.fill()
-			for line in range(1, min(self.graphDepth, ymin)):
-				alpha = 0.5 - float(line) / float(2 * self.graphDepth)
-				if x2 > 2 * self.graphDepth:
-					self.ctx.set_source_rgba(color[0], color[1], color[2], alpha)
-					self.ctx.rectangle(x1, self.graphBRY + line, x2 - self.graphDepth, 1)
-					self.ctx.fill()
-					self.ctx.set_source_rgba(shadow[0], shadow[1], shadow[2], alpha)
-					self.ctx.rectangle(x1 + x2 - self.graphDepth, self.graphBRY + line, self.graphDepth, 1)
-					self.ctx.fill()
-				else:
-					self.ctx.set_source_rgba(color[0], color[1], color[2], alpha)
-					self.ctx.rectangle(x1, self.graphBRY + line, x2, 1)
-					self.ctx.fill()
+				shadows.rectangle(shadow, x1 + x2 - self.graphDepth, self.graphBRY - ymin, self.graphDepth, ymin)
+				if lines > 0:
+					reflections.rectangle(self.fadeGradient(color, self.graphBRY), x1, self.graphBRY + 1, x2 - self.graphDepth, lines)
+					reflections.rectangle(self.fadeGradient(shadow, self.graphBRY), x1 + x2 - self.graphDepth, self.graphBRY + 1, self.graphDepth, lines)
+			elif lines > 0:
+				reflections.rectangle(self.fadeGradient(color, self.graphBRY), x1, self.graphBRY + 1, x2, lines)
 			i += 1
+		self.fillBatch(reflections)
+		self.fillBatch(bars)
+		self.fillBatch(shadows)
 
 	def draw(self, margin = 0.0):
 		self.computeBound(margin = margin)
 		self.computeLabelMargin()
-		self.createImage()
-		self.printTitle()
-		self.printBar()
-		self.printAxis()
-		self.printLabel()
+		points = self.points
+		self.points = self.samplePoints()
+		self.sampleCount = len(self.points)
+		try:
+			self.printStatic()
+			self.printBar()
+			self.printAxis()
+			self.printLegend()
+		finally:
+			self.points = points
 
 class VerticalComparativeBarChart(VerticalChart):
-	groups = []
+	groups = ()
 	groupSize = 2
 	def printAxis(self):
 		if not self.sampleCount:
 			return
+		ticks = FillBatch()
 		minValue = self.axis.displayMin
 		maxValue = self.axis.displayMax
 		stepValue = self.axis.tics
 		value = minValue
 		while value <= maxValue:
 			y = int(self.graphBRY - (value - minValue) * self.graphHeight / self.axis.displayDelta)
-			self.ctx.set_source_rgb(*self.textColor)
-			self.ctx.rectangle(self.graphTLX - 3, y, 1, 1)
-			self.ctx.fill()
-			self.ctx.rectangle(self.graphTLX - 1, y, 1, 1)
-			self.ctx.fill()
+			ticks.rectangle(self.textColor, self.graphTLX - 3, y, 1, 1)
+			ticks.rectangle(self.textColor, self.graphTLX - 1, y, 1, 1)
 			self.text.printText(self.ctx, (self.graphTLX - 5, y), self.textColor, '%u' % value, self.text.HORIZONTAL_RIGHT_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
 			value += stepValue
 		columnWidth = self.graphWidth / len(self.groups)
 		i = 0
 		for group in self.groups:
 			x = int(self.graphTLX + i * columnWidth)
-			self.ctx.set_source_rgb(*self.textColor)
-			self.ctx.rectangle(x, self.graphBRY + 3, 1, 1)
-			self.ctx.fill()
-			self.ctx.rectangle(x, self.graphBRY + 1, 1, 1)
-			self.ctx.fill()
+			ticks.rectangle(self.textColor, x, self.graphBRY + 3, 1, 1)
+			ticks.rectangle(self.textColor, x, self.graphBRY + 1, 1, 1)
 			self.text.printText(self.ctx, (x + columnWidth * 0.5, self.graphBRY + 2), self.textColor, group, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_TOP_ALIGN)
 			i += 1
+		self.fillBatch(ticks)
+
+	def reset(self):
+		super(VerticalComparativeBarChart, self).reset()
+		self.groups = []
 
 	def addGroup(self, name):
 		self.groups.append(name)
 
+	def streamReducer(self):
+		return None
+
 	def setGroupSize(self, groupSize):
 		self.groupSize = groupSize
 
@@ -252,148 +366,247 @@ class VerticalComparativeBarChart(VerticalChart):
 		stepValue = self.axis.tics
 		columnWidth = int(self.graphWidth / self.groupSize / len(self.groups))
 		i = 0
+		bars = FillBatch()
+		shadows = FillBatch()
+		reflections = FillBatch()
+		self.gradients = {}
 		for point in self.points:
 			x = self.graphTLX + i * columnWidth
 			value = point[1]
 			ymin = int((value - minValue) * self.graphHeight / self.axis.displayDelta)
-			self.text.printText(self.ctx, (x + columnWidth * 0.5, self.graphBRY - ymin - self.text.fontSize * 0.5), self.textColor, '%u' % value, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_BOTTOM_ALIGN)
+			label = '%u' % value
+			if self.text.textWidth(label) <= columnWidth:
+				self.text.printText(self.ctx, (x + columnWidth * 0.5, self.graphBRY - ymin - self.text.fontSize * 0.5), self.textColor, label, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_BOTTOM_ALIGN)
 			x1 = x + self.text.fontSize * 0.5
 			x2 = columnWidth - self.text.fontSize
+			if x2 <= 0:
+				i += 1
+				continue
 			color = self.palette[i % self.groupSize % len(self.palette)]
-			self.ctx.set_source_rgb(*color)
-			self.ctx.rectangle(x1, self.graphBRY - ymin, x2, ymin)
-			self.ctx.fill()
+			bars.rectangle(color, x1, self.graphBRY - ymin, x2, ymin)
+			lines = min(self.graphDepth, ymin) - 1
 			if x2 > 2 * self.graphDepth:
 				shadow = self.shadowPalette[i % self.groupSize % len(self.palette)]
-				self.ctx.set_source_rgb(*shadow)
-				self.ctx.rectangle(x1 + x2 - self.graphDepth, self.graphBRY - ymin, self.graphDepth, ymin)
-				self.ctx.fill()
-			for line in range(1, min(self.graphDepth, ymin)):
-				alpha = 0.5 - float(line) / float(2 * self.graphDepth)
-				if x2 > 2 * self.graphDepth:
-					self.ctx.set_source_rgba(color[0], color[1], color[2], alpha)
-					self.ctx.rectangle(x1, self.graphBRY + line, x2 - self.graphDepth, 1)
-					self.ctx.fill()
-					self.ctx.set_source_rgba(shadow[0], shadow[1], shadow[2], alpha)
-					self.ctx.rectangle(x1 + x2 - self.graphDepth, self.graphBRY + line, self.graphDepth, 1)
-					self.ctx.fill()
-				else:
-					self.ctx.set_source_rgba(color[0], color[1], color[2], alpha)
-					self.ctx.rectangle(x1, self.graphBRY + line, x2, 1)
-					self.ctx.fill()
+				shadows.rectangle(shadow, x1 + x2 - self.graphDepth, self.graphBRY - ymin, self.graphDepth, ymin)
+				if lines > 0:
+					reflections.rectangle(self.fadeGradient(color, self.graphBRY), x1, self.graphBRY + 1, x2 - self.graphDepth, lines)
+					reflections.rectangle(self.fadeGradient(shadow, self.graphBRY), x1 + x2 - self.graphDepth, self.graphBRY + 1, self.graphDepth, lines)
+			elif lines > 0:
+				reflections.rectangle(self.fadeGradient(color, self.graphBRY), x1, self.graphBRY + 1, x2, lines)
 			i += 1
+		self.fillBatch(reflections)
+		self.fillBatch(bars)
+		self.fillBatch(shadows)
+
+	def prepareData(self, margin = 0.0):
+		self.computeBound(margin = margin)
+		self.computeLabelMargin()
 
 	def draw(self, margin = 0.0):
 		self.computeBound(margin = margin)
 		self.computeLabelMargin()
-		self.createImage()
-		self.printTitle()
+		self.printStatic()
 		self.printBar()
 		self.printAxis()
-		self.printLabel()
+		self.printLegend()
 
 class VerticalComparativeKnotChart(VerticalComparativeBarChart):
-	groups = []
+	groups = ()
 	groupSize = 2
+	incremental = False
+	capacity = 0
+	drawnState = None
+
+	def setIncremental(self, capacity = 0):
+		self.incremental = True
+		self.capacity = capacity
+
+	def addGroup(self, name):
+		super(VerticalComparativeKnotChart, self).addGroup(name)
+		if self.incremental and len(self.groups) > self.capacity:
+			self.capacity = max(2 * self.capacity, len(self.groups))
+
+	def appendGroup(self, name, points):
+		self.addGroup(name)
+		for point in points:
+			self.addPoint(point)
+
+	def groupSlots(self):
+		return max(len(self.groups), self.capacity)
+
+	def layoutInputs(self):
+		return super(VerticalComparativeKnotChart, self).layoutInputs() + (self.incremental, self.groupSlots())
+
 	def printAxis(self):
 		if not self.sampleCount:
 			return
+		ticks = FillBatch()
 		minValue = self.axis.displayMin
 		maxValue = self.axis.displayMax
 		stepValue = self.axis.tics
 		value = minValue
 		while value <= maxValue:
 			y = int(self.graphBRY - (value - minValue) * self.graphHeight / self.axis.displayDelta)
-			self.ctx.set_source_rgb(*self.textColor)
-			self.ctx.rectangle(self.graphTLX - 3, y, 1, 1)
-			self.ctx.fill()
-			self.ctx.rectangle(self.graphTLX - 1, y, 1, 1)
-			self.ctx.fill()
+			ticks.rectangle(self.textColor, self.graphTLX - 3, y, 1, 1)
+			ticks.rectangle(self.textColor, self.graphTLX - 1, y, 1, 1)
 			self.text.printText(self.ctx, (self.graphTLX - 5, y), self.textColor, '%u' % value, self.text.HORIZONTAL_RIGHT_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
 			value += stepValue
-		columnWidth = self.graphWidth / len(self.groups)
-		i = 0
-		for group in self.groups:
-			x = int(self.graphTLX + (i + 0.5) * columnWidth)
-			self.ctx.set_source_rgb(*self.textColor)
-			self.ctx.rectangle(x, self.graphBRY + 3, 1, 1)
-			self.ctx.fill()
-			self.ctx.rectangle(x, self.graphBRY + 1, 1, 1)
-			self.ctx.fill()
-			self.text.printText(self.ctx, (x, self.graphBRY + 2), self.textColor, group, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_TOP_ALIGN)
-			i += 1
+		self.fillBatch(ticks)
+		for i in range(len(self.groups)):
+			self.printGroupLabel(i)
+
+	def printGroupLabel(self, i):
+		ticks = FillBatch()
+		columnWidth = self.graphWidth / self.groupSlots()
+		x = int(self.graphTLX + (i + 0.5) * columnWidth)
+		ticks.rectangle(self.textColor, x, self.graphBRY + 3, 1, 1)
+		ticks.rectangle(self.textColor, x, self.graphBRY + 1, 1, 1)
+		self.fillBatch(ticks)
+		if self.text.textWidth(self.groups[i]) <= columnWidth:
+			self.text.printText(self.ctx, (x, self.graphBRY + 2), self.textColor, self.groups[i], self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_TOP_ALIGN)
+
+	def printSegment(self, i, columnWidth):
+		minValue = self.axis.displayMin
+		x = self.graphTLX + (int(i / self.groupSize) + 0.5) * columnWidth
+		ymin = int((self.points[i][1] - minValue) * self.graphHeight / self.axis.displayDelta)
+		color = self.palette[i % self.groupSize % len(self.palette)]
+		lastPoint = self.points[i - self.groupSize]
+		self.ctx.set_source_rgb(*color)
+		self.ctx.move_to(x, self.graphBRY - ymin)
+		lastymin = int((lastPoint[1] - minValue) * self.graphHeight / self.axis.displayDelta)
+		self.ctx.line_to(x - columnWidth, self.graphBRY - lastymin)
+		self.ctx.set_line_width(self.text.fontSize * 0.5)
+		self.ctx.stroke()
+
+	def printKnot(self, i, columnWidth):
+		minValue = self.axis.displayMin
+		x = self.graphTLX + (int(i / self.groupSize) + 0.5) * columnWidth
+		value = self.points[i][1]
+		ymin = int((value - minValue) * self.graphHeight / self.axis.displayDelta)
+		color = self.palette[i % self.groupSize % len(self.palette)]
+		self.ctx.set_source_rgb(*color)
+		self.ctx.arc(x, self.graphBRY - ymin, self.text.fontSize, 0, 2 * pi)
+		self.ctx.fill()
+		label = '%u' % value
+		if self.text.textWidth(label) <= columnWidth:
+			self.text.printText(self.ctx, (x, self.graphBRY - ymin), self.textColor, label, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
 
 	def printKnots(self):
 		if not self.sampleCount:
 			self.text.printText(self.ctx, ((self.graphTLX + self.graphBRX) / 2, (self.graphTLY + self.graphBRY) / 2), self.textColor, 'No data', self.text.VERTICAL_CENTER_ALIGN | self.text.HORIZONTAL_CENTER_ALIGN);
 			return;
-		minValue = self.axis.displayMin
-		maxValue = self.axis.displayMax
-		stepValue = self.axis.tics
-		columnWidth = int(self.graphWidth / len(self.groups))
-		i = 0
-		for point in self.points:
-			x = self.graphTLX + (int(i / self.groupSize) + 0.5) * columnWidth
-			value = point[1]
-			ymin = int((value - minValue) * self.graphHeight / self.axis.displayDelta)
-			color = self.palette[i % self.groupSize % len(self.palette)]
-			if i >= self.groupSize:
-				lastPoint = self.points[i - self.groupSize]
-				self.ctx.set_source_rgb(*color)
-				self.ctx.move_to(x, self.graphBRY - ymin)
-				lastymin = int((lastPoint[1] - minValue) * self.graphHeight / self.axis.displayDelta)
-				self.ctx.line_to(x - columnWidth, self.graphBRY - lastymin)
-				self.ctx.set_line_width(self.text.fontSize * 0.5)
-				self.ctx.stroke()
-			i += 1
-		i = 0
-		for point in self.points:
-			x = self.graphTLX + (int(i / self.groupSize) + 0.5) * columnWidth
-			value = point[1]
-			ymin = int((value - minValue) * self.graphHeight / self.axis.displayDelta)
-			color = self.palette[i % self.groupSize % len(self.palette)]
-			self.ctx.set_source_rgb(*color)
-			self.ctx.arc(x, self.graphBRY - ymin, self.text.fontSize, 0, 2 * pi)
-			self.ctx.fill()
-			self.text.printText(self.ctx, (x, self.graphBRY - ymin), self.textColor, '%u' % value, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
-			i += 1
+		columnWidth = int(self.graphWidth / self.groupSlots())
+		for i in range(self.groupSize, len(self.points)):
+			self.printSegment(i, columnWidth)
+		for i in range(len(self.points)):
+			self.printKnot(i, columnWidth)
+
+	def sampleGroups(self):
+		if not self.sampling:
+			return (self.points, self.groups)
+		count = min(len(self.groups), len(self.points) // self.groupSize)
+		buckets = max(1, self.sampleColumns() // self.groupSize // sampling.pointsPerBucket[self.sampling])
+		kept = set()
+		for series in range(self.groupSize):
+			values = self.points.values[series:count * self.groupSize:self.groupSize]
+			kept.update(sampling.methods[self.sampling](values, buckets))
+		kept = sorted(kept)
+		points = []
+		for group in kept:
+			points.extend(self.points[group * self.groupSize:(group + 1) * self.groupSize])
+		return (points, [self.groups[group] for group in kept])
+
+	def layoutKey(self, margin):
+		return (self.layoutInputs(), self.outputFormat, self.width, self.height, self.scale, margin)
+
+	def canAppend(self, margin):
+		state = self.drawnState
+		if state is None or state['layout'] != self.layoutKey(margin) or state['count'] < self.groupSize:
+			return False
+		if len(self.groups) > self.groupSlots() or len(self.groups) > state['slots']:
+			return False
+		if len(self.points) < state['count'] or len(self.points) % self.groupSize:
+			return False
+		yMin = state['yMin']
+		yMax = state['yMax']
+		for point in self.points[state['count']:]:
+			yMin = min(yMin, point[1])
+			yMax = max(yMax, point[1])
+		axis = Axis(yMin * (1.0 - margin), yMax)
+		axis.computeBoundaries()
+		if (axis.displayMin, axis.displayMax, axis.tics) != (self.axis.displayMin, self.axis.displayMax, self.axis.tics):
+			return False
+		state['yMin'] = yMin
+		state['yMax'] = yMax
+		return True
+
+	def drawAppended(self):
+		state = self.drawnState
+		columnWidth = int(self.graphWidth / self.groupSlots())
+		start = state['count']
+		for i in range(max(start, self.groupSize), len(self.points)):
+			self.printSegment(i, columnWidth)
+		for i in range(max(start - self.groupSize, 0), len(self.points)):
+			self.printKnot(i, columnWidth)
+		for i in range(state['groups'], len(self.groups)):
+			self.printGroupLabel(i)
+		self.sampleCount = len(self.points)
+		state['count'] = len(self.points)
+		state['groups'] = len(self.groups)
+
+	def finishSurface(self):
+		if not self.incremental or self.outputFormat != 'png':
+			super(VerticalComparativeKnotChart, self).finishSurface()
 
 	def draw(self, margin = 0.0):
+		if self.incremental and not self.sampling and self.sharedContext is None and self.canAppend(margin):
+			self.drawAppended()
+			return
 		self.computeBound(margin = margin)
 		self.computeLabelMargin()
-		self.createImage()
-		self.printTitle()
-		self.printKnots()
-		self.printAxis()
-		self.printLabel()
+		(points, groups) = (self.points, self.groups)
+		(self.points, self.groups) = self.sampleGroups()
+		self.sampleCount = len(self.points)
+		try:
+			self.printStatic()
+			self.printKnots()
+			self.printAxis()
+			self.printLegend()
+		finally:
+			(self.points, self.groups) = (points, groups)
+		self.drawnState = None
+		if self.incremental and not self.sampling and self.outputFormat == 'png' and self.sharedContext is None:
+			(yMin, yMax) = self.points.bounds() if self.points else (0, 0)
+			self.drawnState = {'layout': self.layoutKey(margin), 'count': len(self.points), 'groups': len(self.groups), 'slots': self.groupSlots(), 'yMin': yMin, 'yMax': yMax}
 
 class HorizontalChart(VerticalChart):
+	def sampleColumns(self, gutter = 0):
+		return int(self.graphHeight / max(self.sampleWidth, gutter + 1))
+
 	def printAxis(self):
 		if not self.sampleCount:
 			return;
+		ticks = FillBatch()
 		minValue = self.axis.displayMin
 		maxValue = self.axis.displayMax
 		stepValue = self.axis.tics
 		value = minValue
 		while value <= maxValue:
 			x = int(self.graphTLX + (value - minValue) * self.graphWidth / self.axis.displayDelta)
-			self.ctx.set_source_rgb(*self.textColor)
-			self.ctx.rectangle(x, self.graphBRY + 3, 1, 1)
-			self.ctx.fill()
-			self.ctx.rectangle(x, self.graphBRY + 1, 1, 1)
-			self.ctx.fill()
+			ticks.rectangle(self.textColor, x, self.graphBRY + 3, 1, 1)
+			ticks.rectangle(self.textColor, x, self.graphBRY + 1, 1, 1)
 			self.text.printText(self.ctx, (x, self.graphBRY + 5), self.textColor, '%u' % value, self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_TOP_ALIGN)
 			value += stepValue
 		columnHeight = self.graphHeight / self.sampleCount
-		i = 0
-		for point in self.points:
+		lastY = None
+		for i in range(self.sampleCount):
 			y = int(self.graphTLY + i * columnHeight)
-			self.ctx.set_source_rgb(*self.textColor)
-			self.ctx.rectangle(self.graphTLX - 3, y, 1, 1)
-			self.ctx.fill()
-			self.ctx.rectangle(self.graphTLX - 1, y, 1, 1)
-			self.ctx.fill()
-			i += 1
+			if y == lastY:
+				continue
+			lastY = y
+			ticks.rectangle(self.textColor, self.graphTLX - 3, y, 1, 1)
+			ticks.rectangle(self.textColor, self.graphTLX - 1, y, 1, 1)
+		self.fillBatch(ticks)
 
 	def computeLabelMargin(self):
 		self.axis = Axis(self.yMinValue, self.yMaxValue)
@@ -415,28 +628,32 @@ class HorizontalChart(VerticalChart):
 		stepValue = self.axis.tics
 		columnHeight = int(self.graphHeight / self.sampleCount)
 		i = 0
+		bars = FillBatch()
+		shadows = FillBatch()
+		reflections = FillBatch()
+		self.gradients = {}
 		for point in self.points:
 			y = self.graphTLY + i * columnHeight
 			value = point[1]
 			xmin = int((value - minValue) * self.graphWidth / self.axis.displayDelta)
-			self.text.printText(self.ctx, (self.graphTLX + xmin + self.text.fontSize * 0.5, y + columnHeight * 0.5), self.textColor, '%u' % value, self.text.HORIZONTAL_LEFT_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
+			if columnHeight >= self.text.fontSize:
+				self.text.printText(self.ctx, (self.graphTLX + xmin + self.text.fontSize * 0.5, y + columnHeight * 0.5), self.textColor, '%u' % value, self.text.HORIZONTAL_LEFT_ALIGN | self.text.VERTICAL_CENTER_ALIGN)
 			y1 = y + self.text.fontSize * 0.5
 			y2 = columnHeight - self.text.fontSize
+			if y2 <= 0:
+				i += 1
+				continue
 			color = self.palette[i % len(self.palette)]
-			self.ctx.set_source_rgb(*color)
-			self.ctx.rectangle(self.graphTLX + 1, y1, xmin, y2)
-			self.ctx.fill()
+			bars.rectangle(color, self.graphTLX + 1, y1, xmin, y2)
 			if y2 > 2 * self.graphDepth:
 				shadow = self.shadowPalette[i % len(self.palette)]
-				self.ctx.set_source_rgb(*shadow)
-				self.ctx.rectangle(self.graphTLX + 1, y1 + y2 - self.graphDepth, xmin, self.graphDepth)
-				self.ctx.fill()
-			for line in range(self.graphDepth):
-				alpha = 0.5 - float(line) / float(2 * self.graphDepth)
-				self.ctx.set_source_rgba(color[0], color[1], color[2], alpha)
-				self.ctx.rectangle(self.graphTLX + 1, y1 + y2 + line, xmin, 1)
-				self.ctx.fill()
+				shadows.rectangle(shadow, self.graphTLX + 1, y1 + y2 - self.graphDepth, xmin, self.graphDepth)
+			if self.graphDepth > 0:
+				reflections.rectangle(self.fadeGradient(color, y1 + y2), self.graphTLX + 1, y1 + y2, xmin, self.graphDepth)
 			i += 1
+		self.fillBatch(reflections)
+		self.fillBatch(bars)
+		self.fillBatch(shadows)
 
 if __name__ == '__main__':
 	foo = VerticalComparativeBarChart(background = (0, 0, 0, 1), foreground = (1, 1, 1))
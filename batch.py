@@ -0,0 +1,73 @@
+import multiprocessing
+import signal
+import traceback
+
+class BatchError(Exception):
+	def __init__(self, index, message):
+		Exception.__init__(self, message)
+		self.index = index
+
+class JobTimeout(Exception):
+	pass
+
+def buildChart(spec):
+	chart = spec['chart'](palette = spec.get('palette'), background = spec.get('background', (1, 1, 1, 1)), foreground = spec.get('foreground', (0, 0, 0)))
+	chart.selectFont(*spec.get('font', ('Sans', 10)))
+	if 'title' in spec:
+		chart.setTitle(spec['title'])
+	if 'chartRatio' in spec:
+		chart.setChartRatio(spec['chartRatio'])
+	if 'graphDepth' in spec:
+		chart.graphDepth = spec['graphDepth']
+	if 'groupSize' in spec:
+		chart.setGroupSize(spec['groupSize'])
+	if 'groups' in spec:
+		for group in spec['groups']:
+			chart.addGroup(group)
+	for point in spec.get('points', ()):
+		chart.addPoint(tuple(point))
+	return chart
+
+def alarm(signum, frame):
+	raise JobTimeout()
+
+def renderJob(task):
+	(index, spec, timeout) = task
+	if timeout:
+		signal.signal(signal.SIGALRM, alarm)
+		signal.setitimer(signal.ITIMER_REAL, timeout)
+	try:
+		chart = buildChart(spec)
+		return (index, chart.render(spec['width'], spec['height'], **spec.get('kwargs', {})), None)
+	except JobTimeout:
+		return (index, None, 'Job timed out after %s seconds' % timeout)
+	except Exception:
+		return (index, None, traceback.format_exc())
+	finally:
+		if timeout:
+			signal.setitimer(signal.ITIMER_REAL, 0)
+
+def iterRenderMany(jobs, workers = None, timeout = None, ordered = False):
+	tasks = [(index, spec, timeout) for (index, spec) in enumerate(jobs)]
+	pool = multiprocessing.Pool(workers)
+	try:
+		if ordered:
+			results = pool.imap(renderJob, tasks)
+		else:
+			results = pool.imap_unordered(renderJob, tasks)
+		for (index, data, error) in results:
+			if error is not None:
+				yield (index, BatchError(index, error))
+			else:
+				yield (index, data)
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+
+def renderMany(jobs, workers = None, timeout = None):
+	jobs = list(jobs)
+	results = [None] * len(jobs)
+	for (index, result) in iterRenderMany(jobs, workers = workers, timeout = timeout):
+		results[index] = result
+	return results
@@ -0,0 +1,146 @@
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import sys
+
+CHARTS = ('PieChart', 'VerticalChart', 'HorizontalChart', 'VerticalComparativeBarChart', 'VerticalComparativeKnotChart')
+RASTER_CHARTS = ('VerticalChart', 'HorizontalChart')
+
+def package():
+	return sys.modules[__package__ or __name__.rpartition('.')[0]]
+
+def buildCase(case):
+	chart = getattr(package(), case['chart'])()
+	chart.selectFont('Sans', 10)
+	chart.setTitle('Benchmark')
+	chart.graphDepth = case['depth']
+	rand = random.Random(case['points'])
+	if hasattr(chart, 'addGroup'):
+		chart.setGroupSize(3)
+		for group in range(max(1, case['points'] // 3)):
+			chart.addGroup('g%d' % group)
+	for i in range(case['points']):
+		chart.addPoint(('p%d' % i, rand.randint(1, 1000)))
+	if case.get('engine') == 'raster':
+		chart.setRasterEngine()
+	return chart
+
+def pixelDiff(case):
+	import numpy
+	images = []
+	for engine in ('cairo', 'raster'):
+		chart = buildCase(dict(case, engine = engine))
+		data = chart.renderRaw(case['width'], case['height'])
+		images.append(numpy.frombuffer(data, dtype = numpy.uint8).astype(numpy.int16))
+		chart.release()
+	diff = numpy.abs(images[0] - images[1])
+	return (int(diff.max()) if diff.size else 0, int(numpy.count_nonzero(diff.reshape(-1, 4).max(axis = 1))))
+
+def runCase(case):
+	chart = buildCase(case)
+	profiler = package().Profiler()
+	chart.setProfiler(profiler)
+	size = 0
+	total = package().RenderStats()
+	for i in range(case['repeat']):
+		size = len(chart.render(case['width'], case['height']))
+		total.time += chart.renderStats.time
+		for (name, value) in chart.renderStats.phases.items():
+			total.addTime(name, value)
+		total.calls = chart.renderStats.calls
+	result = dict(case)
+	result['phases'] = dict((name, value / case['repeat']) for (name, value) in total.phases.items())
+	result['calls'] = total.calls
+	result['time'] = total.time / case['repeat']
+	result['peakRSS'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	result['bytes'] = size
+	if case.get('engine') == 'raster':
+		(result['maxDiff'], result['diffPixels']) = pixelDiff(case)
+	return result
+
+def caseKey(case):
+	key = '%s/%dx%d/%d/%d' % (case['chart'], case['width'], case['height'], case['points'], case['depth'])
+	if case.get('engine', 'cairo') != 'cairo':
+		key += '/' + case['engine']
+	return key
+
+def buildMatrix(charts, sizes, points, depths, repeat, engines = ('cairo',)):
+	cases = []
+	for chart in charts:
+		for (width, height) in sizes:
+			for count in points:
+				for depth in depths:
+					for engine in engines:
+						if engine != 'cairo' and chart not in RASTER_CHARTS:
+							continue
+						cases.append({'chart': chart, 'width': width, 'height': height, 'points': count, 'depth': depth, 'repeat': repeat, 'engine': engine})
+	return cases
+
+def runSuite(cases):
+	results = []
+	for case in cases:
+		pool = multiprocessing.Pool(1)
+		try:
+			results.append(pool.apply(runCase, (case,)))
+		finally:
+			pool.terminate()
+			pool.join()
+	return results
+
+def compare(results, baseline, tolerance = 0.2):
+	previous = dict((caseKey(result), result) for result in baseline)
+	regressions = []
+	for result in results:
+		old = previous.get(caseKey(result))
+		if old is not None and result['time'] > old['time'] * (1.0 + tolerance):
+			regressions.append((caseKey(result), old['time'], result['time']))
+	return regressions
+
+def parseSize(value):
+	(width, height) = value.lower().split('x')
+	return (int(width), int(height))
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = 'Benchmark chart rendering')
+	parser.add_argument('--charts', default = ','.join(CHARTS))
+	parser.add_argument('--sizes', default = '320x240,1000x500,4000x2000')
+	parser.add_argument('--points', default = '10,100,1000')
+	parser.add_argument('--depths', default = '0,10')
+	parser.add_argument('--repeat', type = int, default = 3)
+	parser.add_argument('--engines', default = 'cairo')
+	parser.add_argument('--pixel-tolerance', type = int, default = 3)
+	parser.add_argument('--output')
+	parser.add_argument('--baseline')
+	parser.add_argument('--tolerance', type = float, default = 0.2)
+	args = parser.parse_args(argv)
+	cases = buildMatrix(args.charts.split(','), [parseSize(size) for size in args.sizes.split(',')], [int(count) for count in args.points.split(',')], [int(depth) for depth in args.depths.split(',')], args.repeat, args.engines.split(','))
+	results = runSuite(cases)
+	failed = False
+	for result in results:
+		print('%-60s %9.2f ms %9d KB %9d bytes' % (caseKey(result), result['time'] * 1000, result['peakRSS'], result['bytes']))
+		if result.get('maxDiff', 0) > args.pixel_tolerance:
+			print('PIXEL MISMATCH %s: max channel difference %d over %d pixels' % (caseKey(result), result['maxDiff'], result['diffPixels']))
+			failed = True
+	if args.output:
+		f = open(args.output, 'w')
+		try:
+			json.dump(results, f, indent = 1, sort_keys = True)
+		finally:
+			f.close()
+	if args.baseline:
+		f = open(args.baseline)
+		try:
+			baseline = json.load(f)
+		finally:
+			f.close()
+		regressions = compare(results, baseline, args.tolerance)
+		for (key, old, new) in regressions:
+			print('REGRESSION %s: %.2f ms -> %.2f ms' % (key, old * 1000, new * 1000))
+		if regressions:
+			return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,352 @@
+import cairo
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+class RenderCache(object):
+	def __init__(self, maxBytes = 16 * 1024 * 1024):
+		self.maxBytes = maxBytes
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self, key):
+		with self.lock:
+			data = self.entries.pop(key, None)
+			if data is None:
+				self.misses += 1
+				return None
+			self.entries[key] = data
+			self.hits += 1
+			return data
+
+	def put(self, key, data):
+		if len(data) > self.maxBytes:
+			return
+		with self.lock:
+			old = self.entries.pop(key, None)
+			if old is not None:
+				self.size -= len(old)
+			self.entries[key] = data
+			self.size += len(data)
+			while self.size > self.maxBytes:
+				(oldKey, oldData) = self.entries.popitem(last = False)
+				self.size -= len(oldData)
+				self.evictions += 1
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.size = 0
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.entries), 'bytes': self.size}
+
+class DiskCache(object):
+	tempPrefix = '.tmp-'
+	tempAge = 3600
+	sweepInterval = 60
+	lowWater = 0.9
+
+	def __init__(self, path, maxBytes = 256 * 1024 * 1024, maxAge = None):
+		self.path = path
+		self.maxBytes = maxBytes
+		self.maxAge = maxAge
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.size = None
+		self.swept = 0
+		self.lock = threading.Lock()
+		self.makeDirectory(path)
+
+	def makeDirectory(self, path):
+		try:
+			os.makedirs(path)
+		except OSError:
+			if not os.path.isdir(path):
+				raise
+
+	def entryPath(self, key):
+		return os.path.join(self.path, key[:2], key)
+
+	def expired(self, info, now):
+		return self.maxAge is not None and now - info.st_mtime > self.maxAge
+
+	def remove(self, path):
+		try:
+			os.unlink(path)
+			return True
+		except OSError:
+			return False
+
+	def count(self, name):
+		with self.lock:
+			setattr(self, name, getattr(self, name) + 1)
+
+	def get(self, key):
+		data = self.open(key)
+		if data is None:
+			return None
+		try:
+			return data[:]
+		finally:
+			data.close()
+
+	def open(self, key):
+		path = self.entryPath(key)
+		try:
+			f = open(path, 'rb')
+		except (IOError, OSError):
+			self.count('misses')
+			return None
+		try:
+			info = os.fstat(f.fileno())
+			now = time.time()
+			if info.st_size == 0 or self.expired(info, now):
+				if self.remove(path):
+					self.count('evictions')
+				self.count('misses')
+				return None
+			data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		finally:
+			f.close()
+		try:
+			os.utime(path, (now, info.st_mtime))
+		except OSError:
+			pass
+		self.count('hits')
+		return data
+
+	def put(self, key, data):
+		if not len(data) or len(data) > self.maxBytes:
+			return
+		path = self.entryPath(key)
+		directory = os.path.dirname(path)
+		self.makeDirectory(directory)
+		(fd, temp) = tempfile.mkstemp(prefix = self.tempPrefix, dir = directory)
+		try:
+			f = os.fdopen(fd, 'wb')
+			try:
+				f.write(data)
+			finally:
+				f.close()
+			os.rename(temp, path)
+		except Exception:
+			self.remove(temp)
+			raise
+		with self.lock:
+			if self.size is not None:
+				self.size += len(data)
+			sweep = self.size is None or self.size > self.maxBytes or time.time() - self.swept > self.sweepInterval
+		if sweep:
+			self.evict()
+
+	def scan(self):
+		entries = []
+		now = time.time()
+		for name in os.listdir(self.path):
+			directory = os.path.join(self.path, name)
+			if not os.path.isdir(directory):
+				continue
+			for entry in os.listdir(directory):
+				path = os.path.join(directory, entry)
+				try:
+					info = os.stat(path)
+				except OSError:
+					continue
+				if entry.startswith(self.tempPrefix):
+					if now - info.st_mtime > self.tempAge:
+						self.remove(path)
+				elif self.expired(info, now):
+					if self.remove(path):
+						self.count('evictions')
+				else:
+					entries.append((info.st_atime, info.st_size, path))
+		return entries
+
+	def evict(self):
+		entries = self.scan()
+		size = sum(entry[1] for entry in entries)
+		entries.sort()
+		limit = self.maxBytes if size <= self.maxBytes else self.maxBytes * self.lowWater
+		for (atime, entrySize, path) in entries:
+			if size <= limit:
+				break
+			if self.remove(path):
+				self.count('evictions')
+			size -= entrySize
+		with self.lock:
+			self.size = size
+			self.swept = time.time()
+
+	def clear(self):
+		for (atime, entrySize, path) in self.scan():
+			self.remove(path)
+		with self.lock:
+			self.size = 0
+
+	def stats(self):
+		entries = self.scan()
+		return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(entries), 'bytes': sum(entry[1] for entry in entries)}
+
+class TextCache(object):
+	def __init__(self, maxEntries = 8192, maxFonts = 64):
+		self.maxEntries = maxEntries
+		self.maxFonts = maxFonts
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.faces = {}
+		self.fonts = OrderedDict()
+		self.extents = OrderedDict()
+		self.lock = threading.Lock()
+
+	def getFontFace(self, name, weight):
+		key = (name, weight)
+		face = self.faces.get(key)
+		if face is None:
+			face = cairo.ToyFontFace(name, cairo.FONT_SLANT_NORMAL, weight)
+			self.faces[key] = face
+		return face
+
+	def getScaledFont(self, name, weight, size):
+		key = (name, weight, size)
+		with self.lock:
+			font = self.fonts.pop(key, None)
+			if font is None:
+				matrix = cairo.Matrix(xx = size, yy = size)
+				font = cairo.ScaledFont(self.getFontFace(name, weight), matrix, cairo.Matrix(), cairo.FontOptions())
+				if len(self.fonts) >= self.maxFonts:
+					self.fonts.popitem(last = False)
+			self.fonts[key] = font
+			return font
+
+	def textExtents(self, name, weight, size, text):
+		key = (name, weight, size, text)
+		with self.lock:
+			extents = self.extents.pop(key, None)
+			if extents is not None:
+				self.extents[key] = extents
+				self.hits += 1
+				return extents
+			self.misses += 1
+		font = self.getScaledFont(name, weight, size)
+		extents = font.text_extents(text)[:4]
+		with self.lock:
+			self.extents[key] = extents
+			while len(self.extents) > self.maxEntries:
+				self.extents.popitem(last = False)
+				self.evictions += 1
+		return extents
+
+	def clear(self):
+		with self.lock:
+			self.faces.clear()
+			self.fonts.clear()
+			self.extents.clear()
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.extents), 'fonts': len(self.fonts)}
+
+class SurfacePool(object):
+	def __init__(self, maxBytes = 64 * 1024 * 1024):
+		self.maxBytes = maxBytes
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.surfaces = {}
+		self.lock = threading.Lock()
+
+	def surfaceBytes(self, surface):
+		return surface.get_stride() * surface.get_height()
+
+	def acquire(self, format, width, height):
+		key = (format, width, height)
+		with self.lock:
+			free = self.surfaces.get(key)
+			if free:
+				surface = free.pop()
+				self.size -= self.surfaceBytes(surface)
+				self.hits += 1
+			else:
+				surface = None
+				self.misses += 1
+		if surface is None:
+			return cairo.ImageSurface(format, width, height)
+		ctx = cairo.Context(surface)
+		ctx.set_operator(cairo.OPERATOR_CLEAR)
+		ctx.paint()
+		surface.flush()
+		return surface
+
+	def release(self, surface):
+		key = (surface.get_format(), surface.get_width(), surface.get_height())
+		size = self.surfaceBytes(surface)
+		with self.lock:
+			if self.size + size > self.maxBytes:
+				surface.finish()
+				return
+			self.surfaces.setdefault(key, []).append(surface)
+			self.size += size
+
+	def clear(self):
+		with self.lock:
+			for free in self.surfaces.values():
+				for surface in free:
+					surface.finish()
+			self.surfaces.clear()
+			self.size = 0
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'surfaces': sum(len(free) for free in self.surfaces.values()), 'bytes': self.size}
+
+class LayerCache(object):
+	def __init__(self, maxEntries = 32, maxBytes = 64 * 1024 * 1024):
+		self.maxEntries = maxEntries
+		self.maxBytes = maxBytes
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.layers = OrderedDict()
+		self.lock = threading.Lock()
+
+	def layerBytes(self, layer):
+		return layer.get_stride() * layer.get_height()
+
+	def get(self, key):
+		with self.lock:
+			layer = self.layers.pop(key, None)
+			if layer is None:
+				self.misses += 1
+				return None
+			self.layers[key] = layer
+			self.hits += 1
+			return layer
+
+	def put(self, key, layer):
+		size = self.layerBytes(layer)
+		with self.lock:
+			old = self.layers.pop(key, None)
+			if old is not None:
+				self.size -= self.layerBytes(old)
+			if size > self.maxBytes:
+				return
+			self.layers[key] = layer
+			self.size += size
+			while len(self.layers) > self.maxEntries or self.size > self.maxBytes:
+				self.size -= self.layerBytes(self.layers.popitem(last = False)[1])
+
+	def clear(self):
+		with self.lock:
+			self.layers.clear()
+			self.size = 0
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'layers': len(self.layers), 'bytes': self.size}
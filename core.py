@@ -1,13 +1,227 @@
 import cairo
+import hashlib
+import sys
+import threading
+from array import array
+from collections import OrderedDict
 from math import floor, ceil, log10
+from numbers import Number
 from StringIO import StringIO
+from cache import TextCache
+from executor import RenderExecutor
+import encoders
+import raster
+import sampling
+import streams
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	from itertools import izip
+except ImportError:
+	izip = zip
+
+renderWorkers = 4
+renderExecutor = None
+renderExecutorLock = threading.Lock()
+
+def setRenderWorkers(workers):
+	global renderWorkers
+	renderWorkers = workers
+
+def getRenderExecutor():
+	global renderExecutor
+	with renderExecutorLock:
+		if renderExecutor is None:
+			renderExecutor = RenderExecutor(renderWorkers)
+		return renderExecutor
+
+class Slotted(object):
+	__slots__ = ()
+
+	def __getstate__(self):
+		return dict((name, getattr(self, name)) for name in self.__slots__ if hasattr(self, name))
+
+	def __setstate__(self, state):
+		for (name, value) in state.items():
+			setattr(self, name, value)
+
+class Points(Slotted):
+	__slots__ = ('labels', 'values', 'stats')
+
+	def __init__(self):
+		self.labels = []
+		self.values = array('d')
+		self.stats = None
+
+	def __len__(self):
+		return len(self.values)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return list(zip(self.labels[index], self.values[index]))
+		return (self.labels[index], self.values[index])
+
+	def __iter__(self):
+		return izip(self.labels, self.values)
+
+	def append(self, point):
+		(label, value) = point
+		self.labels.append(label)
+		self.values.append(value)
+		if self.stats is not None:
+			self.stats.add(value)
+
+	def extend(self, values, labels = None):
+		if isinstance(values, array) or (numpy is not None and isinstance(values, numpy.ndarray)):
+			if labels is None:
+				labels = [''] * len(values)
+		elif labels is None:
+			values = list(values)
+			if all(isinstance(value, Number) for value in values):
+				labels = [''] * len(values)
+			else:
+				try:
+					labels = [point[0] for point in values]
+					values = [point[1] for point in values]
+				except (TypeError, IndexError):
+					raise ValueError('Expected numbers or (label, value) pairs')
+		if len(labels) != len(values):
+			raise ValueError('Got %d labels for %d values' % (len(labels), len(values)))
+		if numpy is not None and isinstance(values, numpy.ndarray):
+			data = numpy.ascontiguousarray(values, dtype = 'd').tobytes()
+			if hasattr(self.values, 'frombytes'):
+				self.values.frombytes(data)
+			else:
+				self.values.fromstring(data)
+		else:
+			self.values.extend(array('d', values))
+		self.labels.extend(labels)
+		if self.stats is not None:
+			self.stats.extend(values)
+
+	def consume(self, source, reducer = None):
+		if self.stats is None:
+			self.stats = streams.OnlineStats()
+			self.stats.extend(self.values)
+		stats = self.stats
+		if reducer is None:
+			for (label, value) in source:
+				stats.add(value)
+				self.labels.append(label)
+				self.values.append(value)
+			return
+		for point in source:
+			stats.add(point[1])
+			reducer.add(point)
+		for (label, value) in reducer.points():
+			self.labels.append(label)
+			self.values.append(value)
+
+	def count(self):
+		return self.stats.count if self.stats is not None else len(self.values)
+
+	def valueArray(self):
+		if numpy is not None:
+			return numpy.frombuffer(self.values, dtype = 'd') if self.values else numpy.zeros(0)
+		return self.values
+
+	def bounds(self):
+		if self.stats is not None and self.stats.count:
+			return (self.stats.min, self.stats.max)
+		values = self.valueArray()
+		return (values.min(), values.max()) if numpy is not None else (min(values), max(values))
+
+	def total(self):
+		if self.stats is not None:
+			return self.stats.total
+		return self.valueArray().sum() if numpy is not None else sum(self.values)
+
+	def retainedBytes(self):
+		size = sys.getsizeof(self.labels) + self.values.buffer_info()[1] * self.values.itemsize
+		return size + sum(sys.getsizeof(label) for label in self.labels)
+
+	def digest(self):
+		digest = hashlib.sha1(repr(self.labels).encode('utf-8'))
+		digest.update(self.values)
+		digest.update(repr(self.stats).encode('utf-8'))
+		return digest.hexdigest()
+
+class Fade(Slotted):
+	__slots__ = ('color', 'top', 'depth', 'gradient')
+	alpha = 0.5
+
+	def __init__(self, color, top, depth):
+		self.color = color
+		self.top = top
+		self.depth = depth
+		self.gradient = None
+
+	def __getstate__(self):
+		state = Slotted.__getstate__(self)
+		state['gradient'] = None
+		return state
+
+	def pattern(self):
+		if self.gradient is None:
+			color = self.color
+			self.gradient = cairo.LinearGradient(0, self.top + 0.5, 0, self.top + 0.5 + self.depth)
+			self.gradient.add_color_stop_rgba(0, color[0], color[1], color[2], self.alpha)
+			self.gradient.add_color_stop_rgba(1, color[0], color[1], color[2], 0)
+		return self.gradient
+
+class FillBatch(object):
+	def __init__(self):
+		self.sources = OrderedDict()
+
+	def rectangle(self, source, x, y, width, height):
+		if isinstance(source, (tuple, list)):
+			key = tuple(source)
+		else:
+			key = id(source)
+		if key not in self.sources:
+			self.sources[key] = (source, [])
+		self.sources[key][1].append((x, y, width, height))
+
+	def fill(self, ctx):
+		for (source, rectangles) in self.sources.values():
+			for rectangle in rectangles:
+				ctx.rectangle(*rectangle)
+			if isinstance(source, Fade):
+				ctx.set_source(source.pattern())
+			elif not isinstance(source, (tuple, list)):
+				ctx.set_source(source)
+			elif len(source) == 4:
+				ctx.set_source_rgba(*source)
+			else:
+				ctx.set_source_rgb(*source)
+			ctx.fill()
+		self.sources.clear()
+
+	def fillRaster(self, canvas):
+		canvas.begin()
+		for (source, rectangles) in self.sources.values():
+			if isinstance(source, Fade):
+				canvas.fillRectangles(rectangles, source.color, source.alpha, source)
+			else:
+				canvas.fillRectangles(rectangles, source, source[3] if len(source) == 4 else 1.0)
+		canvas.end()
+		self.sources.clear()
 
 class Chart(object):
 	width = 0
 	height = 0
 	text = None
 	title = 'Untitled chart'
-	points = []
+	points = ()
+	surface = None
+	ctx = None
+	axis = None
+	labels = ()
+	shadowPalette = ()
 	palette = (
 		(231.0/255.0, 0, 0),
 		(0, 156.0/255.0, 231.0/255.0),
@@ -28,6 +242,25 @@ class Chart(object):
 	textColor = (0, 0, 0)
 	backgroundColor = (1, 1, 1)
 	chartRatio = 0.6
+	renderCache = None
+	surfacePool = None
+	layerCache = None
+	staticLayered = False
+	profiler = None
+	renderStats = None
+	scale = 1
+	frozenData = False
+	sharedContext = None
+	legendLimit = None
+	compression = None
+	outputFormat = 'png'
+	outputTarget = None
+	surfaceTypes = {
+		'png': 'ImageSurface',
+		'svg': 'SVGSurface',
+		'pdf': 'PDFSurface'
+	}
+	renderState = ('surface', 'ctx', 'shadowPalette', 'labels', 'percent', 'axis', 'gradients', 'slices', 'drawnState', 'staticLayered', 'outputTarget')
 
 	def __init__(self, palette = None, background = (1, 1, 1, 1), foreground = (0, 0, 0)):
 		if palette:
@@ -35,8 +268,18 @@ class Chart(object):
 		self.textColor = foreground
 		self.backgroundColor = background
 		self.graphDepth = 10
+		self.renderLock = threading.Lock()
 		self.reset()
 
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		state.pop('renderLock', None)
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.renderLock = threading.Lock()
+
 	def computeLabels(self):
 		labels = []
 		for (label, value) in self.points:
@@ -48,7 +291,7 @@ class Chart(object):
 
 	def reset(self):
 		self.text = Text()
-		self.points = []
+		self.points = Points()
 		self.setTitle('Untitled chart')
 
 	def selectFont(self, name, size):
@@ -57,9 +300,69 @@ class Chart(object):
 	def addPoint(self, point):
 		self.points.append(point)
 
+	def addPoints(self, values, labels = None):
+		self.points.extend(values, labels)
+
+	def streamReducer(self):
+		return None
+
+	def addStream(self, source):
+		self.points.consume(source, self.streamReducer())
+
 	def setTitle(self, title):
 		self.title = title
 
+	def setCompression(self, level):
+		self.compression = level
+
+	def setRenderCache(self, renderCache):
+		self.renderCache = renderCache
+
+	def setSurfacePool(self, surfacePool):
+		self.surfacePool = surfacePool
+
+	def setLegendLimit(self, limit):
+		self.legendLimit = limit
+
+	def setLayerCache(self, layerCache):
+		self.layerCache = layerCache
+
+	def setProfiler(self, profiler):
+		self.profiler = profiler
+
+	def layoutInputs(self):
+		return (
+			self.__class__.__name__,
+			getattr(self, 'groupSize', None),
+			tuple(self.palette),
+			tuple(self.textColor),
+			tuple(self.backgroundColor),
+			getattr(self.text, 'fontName', None),
+			getattr(self.text, 'fontSize', None),
+			self.title,
+			self.chartRatio,
+			self.graphDepth,
+			getattr(self, 'sampling', None),
+			getattr(self, 'sampleWidth', None),
+			self.legendLimit,
+			getattr(self, 'sliceLimit', None),
+			getattr(self, 'sliceMinPercent', None),
+			getattr(self, 'otherLabel', None),
+			getattr(self, 'extrusion', None)
+		)
+
+	def cacheKey(self, width, height, **kwargs):
+		inputs = (
+			self.layoutInputs(),
+			self.points.digest(),
+			tuple(getattr(self, 'groups', ())),
+			self.compression,
+			width,
+			height,
+			tuple(sorted(kwargs.items()))
+		)
+		return hashlib.sha1(repr(inputs).encode('utf-8')).hexdigest()
+
 	def outlinedBox(self, point1, point2, color):
 		w = int(point2[0] - point1[0] + 1)
 		h = int(point2[1] - point1[1] + 1)
@@ -71,26 +374,54 @@ class Chart(object):
 
 	def printLabel(self):
 		self.computeLabels()
-		i = 0
 		boxX1 = self.labelTLX + self.margin
 		boxX2 = boxX1 + self.text.fontSize * 1.5
-		for legend in self.labels:
+		rowHeight = self.text.fontSize * 2 + self.margin
+		limit = int((self.height - self.labelTLY - self.margin - self.text.fontSize * 1.5) / rowHeight) + 1
+		if self.legendLimit is not None:
+			limit = min(limit, self.legendLimit)
+		labels = self.labels
+		if len(labels) > limit:
+			labels = labels[:max(limit - 1, 0)]
+		i = 0
+		for legend in labels:
 			color = self.palette[i % len(self.palette)]
-			boxY1 = self.labelTLY + self.margin + i * (self.text.fontSize * 2 + self.margin)
+			boxY1 = self.labelTLY + self.margin + i * rowHeight
 			boxY2 = boxY1 + self.text.fontSize * 1.5
 			self.outlinedBox((boxX1, boxY1), (boxX2, boxY2), color)
 			self.text.printText(self.ctx, (boxX2 + self.margin, boxY1 + self.text.fontSize * 0.75), self.textColor, legend, self.text.VERTICAL_CENTER_ALIGN);
 			i += 1
+		if len(labels) < len(self.labels):
+			boxY1 = self.labelTLY + self.margin + i * rowHeight
+			self.text.printText(self.ctx, (boxX1, boxY1 + self.text.fontSize * 0.75), self.textColor, 'and %d more' % (len(self.labels) - len(labels)), self.text.VERTICAL_CENTER_ALIGN);
 
 	def printTitle(self):
 		self.text.printText(self.ctx, (self.width * 0.5, self.margin * 0.5 + 2 * self.text.fontSize), self.textColor, self.title, align = self.text.HORIZONTAL_CENTER_ALIGN | self.text.VERTICAL_CENTER_ALIGN, weight = cairo.FONT_WEIGHT_BOLD, size = self.text.fontSize * 1.5)
 
+	def createSurface(self):
+		width = int(round(self.width * self.scale))
+		height = int(round(self.height * self.scale))
+		if self.outputFormat == 'png':
+			if self.surfacePool is not None:
+				return self.surfacePool.acquire(cairo.FORMAT_ARGB32, width, height)
+			return cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+		return getattr(cairo, self.surfaceTypes[self.outputFormat])(self.outputTarget, width, height)
+
 	def createImage(self):
-		self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
-		self.ctx = cairo.Context(self.surface)
+		if self.sharedContext is not None:
+			self.surface = self.sharedContext.get_target()
+			self.ctx = self.sharedContext
+		else:
+			self.surface = self.createSurface()
+			self.ctx = cairo.Context(self.surface)
+		if self.scale != 1:
+			self.ctx.scale(self.scale, self.scale)
 		self.ctx.rectangle(0, 0, self.width, self.height)
 		self.ctx.set_source_rgba(*self.backgroundColor)
 		self.ctx.fill()
+		self.computeShadowPalette()
+
+	def computeShadowPalette(self):
 		self.shadowPalette = []
 		shadowFactor = 0.82
 		for colorRGB in self.palette:
@@ -98,22 +429,219 @@ class Chart(object):
 			shadowColor = (red * shadowFactor, green * shadowFactor, blue * shadowFactor)
 			self.shadowPalette.append(shadowColor)
 
-	def render(self, width, height, fileName = None, **kwargs):
+	def layerKey(self):
+		return (
+			self.__class__.__name__,
+			self.width,
+			self.height,
+			self.margin,
+			self.title,
+			tuple(self.labels),
+			self.legendLimit,
+			tuple(self.palette),
+			tuple(self.textColor),
+			tuple(self.backgroundColor),
+			self.text.fontName,
+			self.text.fontSize,
+			self.chartRatio,
+			self.graphDepth
+		)
+
+	def copySurface(self, source):
+		target = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
+		ctx = cairo.Context(target)
+		ctx.set_source_surface(source, 0, 0)
+		ctx.set_operator(cairo.OPERATOR_SOURCE)
+		ctx.paint()
+		return target
+
+	def printStatic(self):
+		self.staticLayered = self.layerCache is not None and self.outputFormat == 'png' and self.scale == 1 and self.sharedContext is None
+		if not self.staticLayered:
+			self.createImage()
+			self.printTitle()
+			return
+		self.computeLabels()
+		key = self.layerKey()
+		layer = self.layerCache.get(key)
+		if layer is None:
+			self.createImage()
+			self.printTitle()
+			self.printLabel()
+			self.layerCache.put(key, self.copySurface(self.surface))
+			return
+		self.surface = self.createSurface()
+		self.ctx = cairo.Context(self.surface)
+		self.ctx.set_source_surface(layer, 0, 0)
+		self.ctx.set_operator(cairo.OPERATOR_SOURCE)
+		self.ctx.paint()
+		self.ctx.set_operator(cairo.OPERATOR_OVER)
+		self.computeShadowPalette()
+
+	def printLegend(self):
+		if not self.staticLayered:
+			self.printLabel()
+
+	def prepareSurface(self, width, height, format = 'png', out = None, **kwargs):
 		self.height = height
 		self.width = width
 		self.margin = self.text.fontSize * 0.5
+		self.outputFormat = format
+		self.outputTarget = out
 		self.draw(**kwargs)
 		self.ctx.show_page()
-		if fileName:
-			self.surface.write_to_png(fileName)
-			self.surface.finish()
+
+	def prepareData(self, **kwargs):
+		pass
+
+	def drawInto(self, ctx, width, height, **kwargs):
+		saved = dict(self.__dict__)
+		self.height = height
+		self.width = width
+		self.margin = self.text.fontSize * 0.5
+		self.sharedContext = ctx
+		try:
+			self.draw(**kwargs)
+		finally:
+			self.__dict__.clear()
+			self.__dict__.update(saved)
+
+	def encode(self, out):
+		if self.outputFormat == 'png':
+			if self.compression is None:
+				self.surface.write_to_png(out)
+			else:
+				encoders.writePNG(self.surface, out, self.compression)
+		self.finishSurface()
+
+	def renderSurface(self, out, width, height, format = 'png', **kwargs):
+		if format not in self.surfaceTypes:
+			raise ValueError('Unsupported output format: %s' % format)
+		if self.profiler is not None:
+			self.profiler.start(self)
+		self.prepareSurface(width, height, format, out, **kwargs)
+		self.encode(out)
+		if self.profiler is not None:
+			self.profiler.finish(self)
+
+	def render(self, width, height, fileName = None, format = 'png', **kwargs):
+		key = None
+		if self.renderCache is not None:
+			key = self.cacheKey(width, height, format = format, **kwargs)
+			data = self.renderCache.get(key)
+			if data is not None:
+				if fileName:
+					self.writeFile(fileName, data)
+					return
+				return data
+		if fileName and key is None:
+			self.renderSurface(fileName, width, height, format, **kwargs)
 		else:
 			buf = StringIO()
-			self.surface.write_to_png(buf)
-			self.surface.finish()
-			return buf.getvalue()
+			self.renderSurface(buf, width, height, format, **kwargs)
+			data = buf.getvalue()
+			if key is not None:
+				self.renderCache.put(key, data)
+			if fileName:
+				self.writeFile(fileName, data)
+				return
+			return data
+
+	def renderTo(self, out, width, height, format = 'png', **kwargs):
+		if self.renderCache is not None:
+			out.write(self.render(width, height, format = format, **kwargs))
+			return
+		self.renderSurface(out, width, height, format, **kwargs)
+
+	def renderSizes(self, sizes, format = 'png', **kwargs):
+		results = []
+		(baseWidth, baseHeight) = sizes[0]
+		try:
+			for (width, height) in sizes:
+				keyArgs = dict(kwargs)
+				if width * baseHeight == height * baseWidth and width != baseWidth:
+					self.scale = float(width) / baseWidth
+					keyArgs['renderBase'] = (baseWidth, baseHeight)
+				else:
+					self.scale = 1
+				key = None
+				if self.renderCache is not None:
+					key = self.cacheKey(width, height, format = format, **keyArgs)
+					data = self.renderCache.get(key)
+					if data is not None:
+						results.append(data)
+						continue
+				if self.scale != 1:
+					(width, height) = (baseWidth, baseHeight)
+				buf = StringIO()
+				self.renderSurface(buf, width, height, format, **kwargs)
+				data = buf.getvalue()
+				if key is not None:
+					self.renderCache.put(key, data)
+				results.append(data)
+				self.frozenData = True
+		finally:
+			self.scale = 1
+			self.frozenData = False
+		return results
+
+	def renderRaw(self, width, height, **kwargs):
+		if self.profiler is not None:
+			self.profiler.start(self)
+		self.prepareSurface(width, height, **kwargs)
+		self.surface.flush()
+		if self.profiler is not None:
+			self.profiler.finish(self)
+		return memoryview(self.surface.get_data())
+
+	def finishSurface(self):
+		if self.surfacePool is not None and self.outputFormat == 'png':
+			self.surfacePool.release(self.surface)
+			self.surface = None
+			self.ctx = None
+			return
+		self.surface.finish()
+
+	def renderLocked(self, width, height, fileName = None, **kwargs):
+		with self.renderLock:
+			return self.render(width, height, fileName, **kwargs)
 
-class Text(object):
+	def renderAsync(self, width, height, fileName = None, **kwargs):
+		return getRenderExecutor().submit(self.renderLocked, width, height, fileName, **kwargs)
+
+	def release(self):
+		if self.surface is not None and self.surfacePool is not None and self.outputFormat == 'png' and self.sharedContext is None:
+			self.surfacePool.release(self.surface)
+		for name in self.renderState:
+			self.__dict__.pop(name, None)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.release()
+
+	def retainedBytes(self):
+		surface = 0
+		if self.surface is not None and hasattr(self.surface, 'get_stride'):
+			surface = self.surface.get_stride() * self.surface.get_height()
+		state = sys.getsizeof(self.__dict__)
+		for name in self.renderState:
+			if name in self.__dict__ and name not in ('surface', 'ctx'):
+				state += sys.getsizeof(self.__dict__[name])
+		groups = getattr(self, 'groups', ())
+		state += sys.getsizeof(groups) + sum(sys.getsizeof(group) for group in groups)
+		points = self.points.retainedBytes()
+		return {'surface': surface, 'points': points, 'state': state, 'total': surface + points + state}
+
+	def writeFile(self, fileName, data):
+		f = open(fileName, 'wb')
+		try:
+			f.write(data)
+		finally:
+			f.close()
+
+class Text(Slotted):
 	HORIZONTAL_LEFT_ALIGN = 1
 	HORIZONTAL_CENTER_ALIGN = 2
 	HORIZONTAL_RIGHT_ALIGN = 4
@@ -122,21 +650,27 @@ class Text(object):
 	VERTICAL_TOP_ALIGN = 32
 	fontCondensed = None
 	fontCondensedBold = None
+	cache = TextCache()
+	__slots__ = ('fontName', 'fontSize')
 
 	def selectFont(self, name, size):
 		self.fontName = name
 		self.fontSize = size
 
+	def textWidth(self, text, weight = cairo.FONT_WEIGHT_NORMAL, size = None):
+		if not size:
+			size = self.fontSize
+		return self.cache.textExtents(self.fontName, weight, size, text)[2]
+
 	def printText(self, canvas, point, color, text, align = 0, weight = cairo.FONT_WEIGHT_NORMAL, size = None):
 		if not size:
 			size = self.fontSize
-		canvas.select_font_face(self.fontName, cairo.FONT_SLANT_NORMAL, weight)
-		canvas.set_font_size(size)
+		canvas.set_scaled_font(self.cache.getScaledFont(self.fontName, weight, size))
 		if not align & self.HORIZONTAL_CENTER_ALIGN and not align & self.HORIZONTAL_RIGHT_ALIGN:
 			align |= self.HORIZONTAL_LEFT_ALIGN
 		if not align & self.VERTICAL_CENTER_ALIGN and not align & self.VERTICAL_TOP_ALIGN:
 			align |= self.VERTICAL_BOTTOM_ALIGN
-		(bw, bh, tw, th) = canvas.text_extents(text)[:4]
+		(bw, bh, tw, th) = self.cache.textExtents(self.fontName, weight, size, text)
 		(pointX, pointY) = point
 		if align & self.HORIZONTAL_CENTER_ALIGN:
 			pointX = pointX - tw / 2
@@ -151,31 +685,86 @@ class Text(object):
 		canvas.show_text(text)
 
 class BarChart(Chart):
+	sampling = None
+	sampleWidth = 1
+	sampleCache = None
+	streamBuckets = 2048
+	rasterEngine = False
+
+	def setSampling(self, method, sampleWidth = 1):
+		self.sampling = method
+		self.sampleWidth = sampleWidth
+
+	def setRasterEngine(self, enabled = True):
+		self.rasterEngine = enabled
+
+	def rasterCanvas(self):
+		if not (self.rasterEngine and raster.available() and self.outputFormat == 'png' and self.scale == 1 and self.sharedContext is None):
+			return None
+		canvas = raster.RasterCanvas(self.surface)
+		return canvas if canvas.writable() else None
+
+	def fillBatch(self, batch):
+		canvas = self.rasterCanvas()
+		if canvas is None:
+			batch.fill(self.ctx)
+		else:
+			batch.fillRaster(canvas)
+
+	def setStreamBuckets(self, buckets):
+		self.streamBuckets = buckets
+
+	def streamReducer(self):
+		if not self.sampling:
+			return None
+		return streams.MinMaxBuckets(self.streamBuckets)
+
+	def sampleColumns(self, gutter = 0):
+		return int(self.graphWidth / max(self.sampleWidth, gutter + 1))
+
+	def samplePoints(self):
+		if not self.sampling:
+			return self.points
+		buckets = max(1, self.sampleColumns(self.text.fontSize) // sampling.pointsPerBucket[self.sampling])
+		key = (len(self.points), self.sampling, buckets)
+		cache = self.sampleCache
+		if cache is None or cache[0] is not self.points or cache[1] != key:
+			indices = sampling.methods[self.sampling](self.points.values, buckets)
+			indices = sampling.keepExtremes(self.points.values, indices, self.points.bounds())
+			cache = self.sampleCache = (self.points, key, indices)
+		return [self.points[i] for i in cache[2]]
+
+	def fadeGradient(self, color, top):
+		key = (tuple(color), top)
+		fade = self.gradients.get(key)
+		if fade is None:
+			fade = Fade(color, top, self.graphDepth)
+			self.gradients[key] = fade
+		return fade
+
+	def prepareData(self, margin = 0.0):
+		self.computeBound(margin = margin)
+		self.computeLabelMargin()
+		self.samplePoints()
+
 	def computeBound(self, margin = 0.0):
+		if self.frozenData:
+			return
 		if not self.points:
 			yMin = 0
 			yMax = 1
 		else:
-			yMax = self.points[0][1]
-			yMin = yMax
-
-			for point in self.points:
-				y = point[1]
-				if y < yMin:
-					yMin = y
-				if y > yMax:
-					yMax = y
+			(yMin, yMax) = self.points.bounds()
 		self.yMinValue = yMin * (1.0 - margin)
 		self.yMaxValue = yMax
 		self.sampleCount = len(self.points)
 
 	def createImage(self, **kwargs):
 		super(BarChart, self).createImage(**kwargs)
-		self.ctx.set_source_rgb(*self.textColor)
-		self.ctx.rectangle(self.graphTLX, self.graphTLY, 1, self.graphHeight)
-		self.ctx.fill()
-		self.ctx.rectangle(self.graphTLX, self.graphBRY, self.graphWidth, 1)
-		self.ctx.fill()
+		lines = FillBatch()
+		lines.rectangle(self.textColor, self.graphTLX, self.graphTLY, 1, self.graphHeight)
+		lines.rectangle(self.textColor, self.graphTLX, self.graphBRY, self.graphWidth, 1)
+		self.fillBatch(lines)
 
 class Axis(object):
 	min = 0
@@ -203,7 +792,7 @@ class Axis(object):
 		elif posns > 0.25:
 			tics = 2.0
 		else:
-			tics = math.ceil(norm)
+			tics = ceil(norm)
 		self.tics = tics * self.magnitude
 
 	def computeBoundaries(self):
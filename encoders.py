@@ -0,0 +1,101 @@
+import struct
+import sys
+import zlib
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+if sys.byteorder == 'little':
+	CHANNELS = (2, 1, 0, 3)
+else:
+	CHANNELS = (1, 2, 3, 0)
+
+def chunk(kind, data):
+	return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+def unpremultiply(rgba):
+	if numpy is not None:
+		pixels = numpy.frombuffer(rgba, dtype = numpy.uint8).reshape(-1, 4).astype(numpy.uint32)
+		alpha = pixels[:, 3:4]
+		mask = (alpha[:, 0] > 0) & (alpha[:, 0] < 255)
+		pixels[mask, :3] = numpy.minimum(255, (pixels[mask, :3] * 255 + alpha[mask] // 2) // alpha[mask])
+		return bytearray(pixels.astype(numpy.uint8).tobytes())
+	for offset in range(0, len(rgba), 4):
+		alpha = rgba[offset + 3]
+		if 0 < alpha < 255:
+			for channel in range(offset, offset + 3):
+				rgba[channel] = min(255, (rgba[channel] * 255 + alpha // 2) // alpha)
+	return rgba
+
+def convertRows(data, stride, width, rows):
+	rowBytes = width * 4
+	rgba = bytearray(rowBytes * rows)
+	for y in range(rows):
+		row = bytearray(data[y * stride:y * stride + rowBytes])
+		target = y * rowBytes
+		for (channel, source) in enumerate(CHANNELS):
+			rgba[target + channel:target + rowBytes:4] = row[source::4]
+	if rgba[3::4].count(b'\xff') != width * rows:
+		rgba = unpremultiply(rgba)
+	scanlines = bytearray()
+	for y in range(rows):
+		scanlines.append(0)
+		scanlines.extend(rgba[y * rowBytes:(y + 1) * rowBytes])
+	return bytes(scanlines)
+
+class PNGWriter(object):
+	chunkSize = 256 * 1024
+
+	def __init__(self, out, width, height, level = 6):
+		self.out = out
+		self.width = width
+		self.height = height
+		self.compressor = zlib.compressobj(level)
+		self.pending = []
+		self.pendingSize = 0
+		self.out.write(PNG_SIGNATURE)
+		self.out.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+
+	def writeData(self, data):
+		if data:
+			self.pending.append(data)
+			self.pendingSize += len(data)
+		if self.pendingSize >= self.chunkSize:
+			self.flush()
+
+	def flush(self):
+		if self.pending:
+			self.out.write(chunk(b'IDAT', b''.join(self.pending)))
+			self.pending = []
+			self.pendingSize = 0
+
+	def writeRows(self, data, stride, rows):
+		self.writeData(self.compressor.compress(convertRows(data, stride, self.width, rows)))
+
+	def close(self):
+		self.writeData(self.compressor.flush())
+		self.flush()
+		self.out.write(chunk(b'IEND', b''))
+
+def writePNG(surface, out, level = 6):
+	if not hasattr(out, 'write'):
+		f = open(out, 'wb')
+		try:
+			return writePNG(surface, f, level)
+		finally:
+			f.close()
+	surface.flush()
+	width = surface.get_width()
+	height = surface.get_height()
+	stride = surface.get_stride()
+	data = surface.get_data()
+	writer = PNGWriter(out, width, height, level)
+	band = max(1, 65536 // max(1, stride))
+	for y in range(0, height, band):
+		rows = min(band, height - y)
+		writer.writeRows(data[y * stride:(y + rows) * stride], stride, rows)
+	writer.close()
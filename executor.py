@@ -0,0 +1,114 @@
+import sys
+import threading
+import time
+from functools import partial
+
+try:
+	from Queue import Queue
+except ImportError:
+	from queue import Queue
+
+class CancelledError(Exception):
+	pass
+
+class RenderTimeout(Exception):
+	pass
+
+class RenderFuture(object):
+	def __init__(self, function):
+		self.function = function
+		self.condition = threading.Condition()
+		self.state = 'pending'
+		self.value = None
+		self.error = None
+		self.callbacks = []
+
+	def done(self):
+		return self.state in ('cancelled', 'finished')
+
+	def cancelled(self):
+		return self.state == 'cancelled'
+
+	def cancel(self):
+		with self.condition:
+			if self.state != 'pending':
+				return self.state == 'cancelled'
+			self.state = 'cancelled'
+			self.condition.notify_all()
+		self.runCallbacks()
+		return True
+
+	def run(self):
+		with self.condition:
+			if self.state != 'pending':
+				return
+			self.state = 'running'
+		(value, error) = (None, None)
+		try:
+			value = self.function()
+		except Exception:
+			error = sys.exc_info()[1]
+		with self.condition:
+			(self.value, self.error) = (value, error)
+			self.state = 'finished'
+			self.condition.notify_all()
+		self.runCallbacks()
+
+	def result(self, timeout = None):
+		deadline = None if timeout is None else time.time() + timeout
+		with self.condition:
+			while not self.done():
+				if deadline is None:
+					self.condition.wait()
+					continue
+				remaining = deadline - time.time()
+				if remaining <= 0:
+					raise RenderTimeout()
+				self.condition.wait(remaining)
+			if self.state == 'cancelled':
+				raise CancelledError()
+			if self.error is not None:
+				raise self.error
+			return self.value
+
+	def addCallback(self, callback):
+		with self.condition:
+			if not self.done():
+				self.callbacks.append(callback)
+				return
+		callback(self)
+
+	def runCallbacks(self):
+		with self.condition:
+			(callbacks, self.callbacks) = (self.callbacks, [])
+		for callback in callbacks:
+			callback(self)
+
+class RenderExecutor(object):
+	def __init__(self, workers, backlog = 0):
+		self.queue = Queue(backlog)
+		self.threads = []
+		for i in range(max(1, workers)):
+			thread = threading.Thread(target = self.work)
+			thread.daemon = True
+			thread.start()
+			self.threads.append(thread)
+
+	def submit(self, function, *args, **kwargs):
+		future = RenderFuture(partial(function, *args, **kwargs))
+		self.queue.put(future)
+		return future
+
+	def work(self):
+		while True:
+			future = self.queue.get()
+			if future is None:
+				return
+			future.run()
+
+	def shutdown(self, wait = True):
+		for thread in self.threads:
+			self.queue.put(None)
+		if wait:
+			for thread in self.threads:
+				thread.join()
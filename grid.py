@@ -0,0 +1,40 @@
+import cairo
+from math import ceil, sqrt
+from StringIO import StringIO
+from core import Chart
+import encoders
+
+def renderGrid(charts, cellWidth, cellHeight, columns = None, format = 'png', compression = None, **kwargs):
+	charts = list(charts)
+	if format not in Chart.surfaceTypes:
+		raise ValueError('Unsupported output format: %s' % format)
+	if columns is None:
+		columns = max(1, int(ceil(sqrt(len(charts)))))
+	rows = max(1, (len(charts) + columns - 1) // columns)
+	width = columns * cellWidth
+	height = rows * cellHeight
+	buf = StringIO()
+	if format == 'png':
+		surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+	else:
+		surface = getattr(cairo, Chart.surfaceTypes[format])(buf, width, height)
+	ctx = cairo.Context(surface)
+	cells = []
+	for (index, chart) in enumerate(charts):
+		x = (index % columns) * cellWidth
+		y = (index // columns) * cellHeight
+		ctx.save()
+		ctx.translate(x, y)
+		ctx.rectangle(0, 0, cellWidth, cellHeight)
+		ctx.clip()
+		chart.drawInto(ctx, cellWidth, cellHeight, **kwargs)
+		ctx.restore()
+		cells.append((x, y, cellWidth, cellHeight))
+	ctx.show_page()
+	if format == 'png':
+		if compression is None:
+			surface.write_to_png(buf)
+		else:
+			encoders.writePNG(surface, buf, compression)
+	surface.finish()
+	return (buf.getvalue(), cells)
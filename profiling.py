@@ -0,0 +1,89 @@
+import time
+from functools import wraps
+
+PHASES = ('computeBound', 'computeLabelMargin', 'computePercent', 'createImage', 'printTitle', 'printBar', 'printKnots', 'printPie', 'printAxis', 'printLabel', 'encode')
+CONTEXTS = ('createImage', 'printStatic')
+COUNTED = ('fill', 'stroke', 'paint', 'show_text')
+
+class RenderStats(object):
+	def __init__(self):
+		self.time = 0.0
+		self.phases = {}
+		self.calls = {}
+
+	def addTime(self, name, seconds):
+		self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+	def addCall(self, name):
+		self.calls[name] = self.calls.get(name, 0) + 1
+
+	def asDict(self):
+		return {'time': self.time, 'phases': dict(self.phases), 'calls': dict(self.calls)}
+
+class CountingContext(object):
+	def __init__(self, ctx, profiler):
+		self.ctx = ctx
+		self.profiler = profiler
+
+	def __getattr__(self, name):
+		attr = getattr(self.ctx, name)
+		if name not in COUNTED:
+			return attr
+		profiler = self.profiler
+		def counted(*args, **kwargs):
+			if profiler.started is not None:
+				profiler.stats.addCall(name)
+			return attr(*args, **kwargs)
+		return counted
+
+class Profiler(object):
+	def __init__(self, callback = None):
+		self.callback = callback
+		self.stats = RenderStats()
+		self.started = None
+
+	def timed(self, name, method):
+		profiler = self
+		@wraps(method)
+		def wrapper(*args, **kwargs):
+			if profiler.started is None:
+				return method(*args, **kwargs)
+			start = time.time()
+			try:
+				return method(*args, **kwargs)
+			finally:
+				profiler.stats.addTime(name, time.time() - start)
+		return wrapper
+
+	def counting(self, chart, method):
+		profiler = self
+		@wraps(method)
+		def wrapper(*args, **kwargs):
+			result = method(*args, **kwargs)
+			if getattr(chart, 'ctx', None) is not None and not isinstance(chart.ctx, CountingContext):
+				chart.ctx = CountingContext(chart.ctx, profiler)
+			return result
+		return wrapper
+
+	def instrument(self, chart):
+		for name in PHASES:
+			method = getattr(chart, name, None)
+			if method is not None:
+				setattr(chart, name, self.timed(name, method))
+		for name in CONTEXTS:
+			setattr(chart, name, self.counting(chart, getattr(chart, name)))
+		chart.profiled = self
+
+	def start(self, chart):
+		if getattr(chart, 'profiled', None) is not self:
+			self.instrument(chart)
+		self.stats = RenderStats()
+		self.started = time.time()
+
+	def finish(self, chart):
+		(stats, self.stats) = (self.stats, RenderStats())
+		stats.time = time.time() - self.started
+		self.started = None
+		chart.renderStats = stats
+		if self.callback is not None:
+			self.callback(chart, stats)
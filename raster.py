@@ -0,0 +1,111 @@
+from math import ceil, floor
+from encoders import CHANNELS
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+def available():
+	return numpy is not None
+
+def spans(start, end):
+	first = int(floor(start))
+	last = int(ceil(end))
+	if last - first == 1:
+		return [(first, last, end - start)]
+	inner = (int(ceil(start)), int(floor(end)))
+	result = []
+	if inner[0] > start:
+		result.append((first, inner[0], inner[0] - start))
+	if inner[1] > inner[0]:
+		result.append((inner[0], inner[1], 1.0))
+	if end > inner[1]:
+		result.append((inner[1], last, end - inner[1]))
+	return result
+
+def pieces(rectangle, width, height):
+	(x, y, w, h) = rectangle
+	(x1, x2) = (max(0.0, x), min(float(width), x + w))
+	(y1, y2) = (max(0.0, y), min(float(height), y + h))
+	if x2 <= x1 or y2 <= y1:
+		return []
+	rows = spans(y1, y2)
+	return [(left, top, right - left, bottom - top, columnCoverage * rowCoverage) for (left, right, columnCoverage) in spans(x1, x2) for (top, bottom, rowCoverage) in rows]
+
+def premultiplied(color, alpha):
+	pixel = numpy.zeros(4, dtype = 'f')
+	pixel[list(CHANNELS)] = [color[0] * alpha * 255, color[1] * alpha * 255, color[2] * alpha * 255, alpha * 255]
+	return pixel
+
+class RasterCanvas(object):
+	sliceArea = 256
+
+	def __init__(self, surface):
+		self.surface = surface
+		self.width = surface.get_width()
+		self.height = surface.get_height()
+		self.rowWords = surface.get_stride() // 4
+		data = numpy.frombuffer(surface.get_data(), dtype = numpy.uint8)
+		self.words = data.view(numpy.uint32).reshape(self.height, self.rowWords)
+		self.flatWords = self.words.reshape(-1)
+
+	def writable(self):
+		return self.words.flags.writeable
+
+	def begin(self):
+		self.surface.flush()
+
+	def end(self):
+		self.surface.mark_dirty()
+
+	def indices(self, x, y, w, h):
+		counts = w * h
+		ids = numpy.repeat(numpy.arange(len(counts)), counts)
+		offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+		return ((y[ids] + offsets // w[ids]) * self.rowWords + x[ids] + offsets % w[ids], ids)
+
+	def split(self, rectangles):
+		table = numpy.array(rectangles, dtype = 'd').reshape(-1, 4)
+		left = numpy.clip(table[:, 0], 0, self.width)
+		right = numpy.clip(table[:, 0] + table[:, 2], 0, self.width)
+		top = numpy.clip(table[:, 1], 0, self.height)
+		bottom = numpy.clip(table[:, 1] + table[:, 3], 0, self.height)
+		edges = numpy.array([left, right, top, bottom])
+		visible = (right > left) & (bottom > top)
+		aligned = visible & (edges == numpy.floor(edges)).all(axis = 0)
+		fractional = []
+		for i in numpy.nonzero(visible & ~aligned)[0]:
+			fractional.extend(pieces((left[i], top[i], right[i] - left[i], bottom[i] - top[i]), self.width, self.height))
+		fractional = numpy.array(fractional, dtype = 'd').reshape(-1, 5)
+		columns = [numpy.concatenate((column[aligned], fractional[:, index])) for (index, column) in enumerate((left, top, right - left, bottom - top))]
+		(x, y, w, h) = [column.astype(numpy.intp) for column in columns]
+		coverage = numpy.concatenate((numpy.ones(aligned.sum()), fractional[:, 4]))
+		return (x, y, w, h, coverage)
+
+	def fillRectangles(self, rectangles, color, alpha, fade = None):
+		(x, y, w, h, coverage) = self.split(rectangles)
+		pixel = premultiplied(color, alpha)
+		if alpha >= 1 and fade is None:
+			solid = coverage >= 1
+			value = numpy.rint(pixel).astype(numpy.uint8).view(numpy.uint32)[0]
+			large = solid & (w * h >= self.sliceArea)
+			for i in numpy.nonzero(large)[0]:
+				self.words[y[i]:y[i] + h[i], x[i]:x[i] + w[i]] = value
+			small = solid & ~large
+			if small.any():
+				self.flatWords[self.indices(x[small], y[small], w[small], h[small])[0]] = value
+			partial = ~solid
+			(x, y, w, h, coverage) = (x[partial], y[partial], w[partial], h[partial], coverage[partial])
+		if not len(coverage):
+			return
+		(index, ids) = self.indices(x, y, w, h)
+		coverage = coverage[ids]
+		if fade is not None:
+			rows = index // self.rowWords
+			coverage = coverage * numpy.clip(1 - (rows - fade.top) / float(fade.depth), 0, 1)
+		weights = coverage.astype('f')[:, None]
+		target = self.flatWords[index].view(numpy.uint8).reshape(-1, 4)
+		result = pixel * weights + target * (1 - alpha * weights)
+		result += 0.5
+		self.flatWords[index] = result.astype(numpy.uint8).view(numpy.uint32).reshape(-1)
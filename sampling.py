@@ -0,0 +1,93 @@
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+def firstMatches(values, targets, ids, starts):
+	matches = numpy.flatnonzero(values == targets[ids])
+	return matches[numpy.searchsorted(matches, starts)]
+
+def vectorMinMax(values, buckets):
+	values = numpy.asarray(values, dtype = 'd')
+	count = len(values)
+	starts = numpy.arange(buckets) * count // buckets
+	ids = numpy.repeat(numpy.arange(buckets), numpy.diff(numpy.append(starts, count)))
+	low = firstMatches(values, numpy.minimum.reduceat(values, starts), ids, starts)
+	high = firstMatches(values, numpy.maximum.reduceat(values, starts), ids, starts)
+	pairs = numpy.column_stack((numpy.minimum(low, high), numpy.maximum(low, high)))
+	keep = numpy.column_stack((numpy.ones(buckets, dtype = bool), low != high))
+	return pairs[keep].tolist()
+
+def minMax(values, buckets):
+	count = len(values)
+	if buckets < 1 or count <= 2 * buckets:
+		return list(range(count))
+	if numpy is not None:
+		return vectorMinMax(values, buckets)
+	indices = []
+	for bucket in range(buckets):
+		start = bucket * count // buckets
+		end = (bucket + 1) * count // buckets
+		if start == end:
+			continue
+		low = min(range(start, end), key = values.__getitem__)
+		high = max(range(start, end), key = values.__getitem__)
+		indices.extend(sorted(set((low, high))))
+	return indices
+
+def lttb(values, buckets):
+	count = len(values)
+	if buckets < 3 or count <= buckets:
+		return list(range(count))
+	indices = [0]
+	every = float(count - 2) / (buckets - 2)
+	a = 0
+	for bucket in range(buckets - 2):
+		avgStart = int((bucket + 1) * every) + 1
+		avgEnd = min(int((bucket + 2) * every) + 1, count)
+		avgX = (avgStart + avgEnd - 1) / 2.0
+		avgY = sum(values[avgStart:avgEnd]) / float(avgEnd - avgStart)
+		rangeStart = int(bucket * every) + 1
+		rangeEnd = int((bucket + 1) * every) + 1
+		maxArea = -1
+		selected = rangeStart
+		for b in range(rangeStart, rangeEnd):
+			area = abs((a - avgX) * (values[b] - values[a]) - (a - b) * (avgY - values[a]))
+			if area > maxArea:
+				maxArea = area
+				selected = b
+		indices.append(selected)
+		a = selected
+	indices.append(count - 1)
+	return indices
+
+def keepExtremes(values, indices, bounds = None):
+	if not indices or len(indices) == len(values):
+		return indices
+	indices = list(indices)
+	if bounds is None:
+		bounds = (min(values), max(values))
+	for bound in bounds:
+		if any(values[i] == bound for i in indices):
+			continue
+		try:
+			extreme = values.index(bound)
+		except ValueError:
+			continue
+		candidates = [i for i in range(len(indices)) if values[indices[i]] not in bounds]
+		if not candidates:
+			break
+		nearest = min(candidates, key = lambda i: abs(indices[i] - extreme))
+		indices[nearest] = extreme
+		indices.sort()
+	return indices
+
+methods = {
+	'minmax': minMax,
+	'lttb': lttb
+}
+
+pointsPerBucket = {
+	'minmax': 2,
+	'lttb': 1
+}
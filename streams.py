@@ -0,0 +1,88 @@
+import heapq
+
+class OnlineStats(object):
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.min = None
+		self.max = None
+
+	def add(self, value):
+		self.count += 1
+		self.total += value
+		if self.min is None or value < self.min:
+			self.min = value
+		if self.max is None or value > self.max:
+			self.max = value
+
+	def extend(self, values):
+		for value in values:
+			self.add(value)
+
+	def __repr__(self):
+		return 'OnlineStats(%r, %r, %r, %r)' % (self.count, self.total, self.min, self.max)
+
+class TopValues(object):
+	def __init__(self, limit):
+		self.limit = limit
+		self.heap = []
+		self.count = 0
+
+	def add(self, point):
+		(label, value) = point
+		entry = (value, -self.count, label)
+		self.count += 1
+		if len(self.heap) < self.limit:
+			heapq.heappush(self.heap, entry)
+		elif self.heap and entry > self.heap[0]:
+			heapq.heapreplace(self.heap, entry)
+
+	def points(self):
+		return [(label, value) for (value, order, label) in sorted(self.heap, key = lambda entry: -entry[1])]
+
+class MinMaxBuckets(object):
+	def __init__(self, buckets):
+		self.buckets = max(1, buckets)
+		self.size = 1
+		self.closed = []
+		self.current = None
+		self.count = 0
+
+	def add(self, point):
+		entry = (self.count, point)
+		self.count += 1
+		if self.current is None:
+			self.current = [entry, entry]
+		else:
+			if point[1] < self.current[0][1][1]:
+				self.current[0] = entry
+			if point[1] > self.current[1][1][1]:
+				self.current[1] = entry
+		if self.count % self.size == 0:
+			self.closed.append(self.current)
+			self.current = None
+			if len(self.closed) >= 2 * self.buckets:
+				self.merge()
+
+	def merge(self):
+		merged = []
+		for i in range(0, len(self.closed), 2):
+			(low, high) = self.closed[i]
+			for (otherLow, otherHigh) in self.closed[i + 1:i + 2]:
+				if otherLow[1][1] < low[1][1]:
+					low = otherLow
+				if otherHigh[1][1] > high[1][1]:
+					high = otherHigh
+			merged.append([low, high])
+		self.closed = merged
+		self.size *= 2
+
+	def points(self):
+		buckets = self.closed + ([self.current] if self.current is not None else [])
+		points = []
+		for (low, high) in buckets:
+			if low[0] == high[0]:
+				points.append(low[1])
+			else:
+				points.extend(point for (index, point) in sorted((low, high)))
+		return points
@@ -0,0 +1,68 @@
+import cairo
+import copy
+from collections import deque
+from StringIO import StringIO
+import core
+from executor import RenderExecutor
+from profiling import CONTEXTS, PHASES
+import encoders
+
+def tileChart(chart):
+	tile = copy.copy(chart)
+	for name in core.Chart.renderState + PHASES + CONTEXTS + ('profiled',):
+		tile.__dict__.pop(name, None)
+	tile.profiler = None
+	return tile
+
+def prepareTiles(chart, width, height, kwargs):
+	template = tileChart(chart)
+	template.width = width
+	template.height = height
+	template.margin = template.text.fontSize * 0.5
+	template.prepareData(**kwargs)
+	template.frozenData = True
+	return template
+
+def drawBand(chart, width, height, top, rows, kwargs):
+	surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, rows)
+	ctx = cairo.Context(surface)
+	ctx.translate(0, -top)
+	ctx.rectangle(0, top, width, rows)
+	ctx.clip()
+	copy.copy(chart).drawInto(ctx, width, height, **kwargs)
+	surface.flush()
+	return surface
+
+def renderTiled(chart, width, height, fileName = None, bandHeight = 256, workers = None, compression = 6, **kwargs):
+	if fileName:
+		f = open(fileName, 'wb')
+		try:
+			renderTiledTo(chart, f, width, height, bandHeight, workers, compression, **kwargs)
+		finally:
+			f.close()
+		return
+	buf = StringIO()
+	renderTiledTo(chart, buf, width, height, bandHeight, workers, compression, **kwargs)
+	return buf.getvalue()
+
+def renderTiledTo(chart, out, width, height, bandHeight = 256, workers = None, compression = 6, **kwargs):
+	workers = workers or core.renderWorkers
+	bands = deque((top, min(bandHeight, height - top)) for top in range(0, height, bandHeight))
+	chart = prepareTiles(chart, width, height, kwargs)
+	writer = encoders.PNGWriter(out, width, height, compression)
+	pending = deque()
+	executor = RenderExecutor(workers, backlog = workers + 1)
+	try:
+		while bands or pending:
+			while bands and len(pending) <= workers:
+				(top, rows) = bands.popleft()
+				pending.append((rows, executor.submit(drawBand, chart, width, height, top, rows, kwargs)))
+			(rows, future) = pending.popleft()
+			surface = future.result()
+			writer.writeRows(surface.get_data(), surface.get_stride(), rows)
+			surface.finish()
+		writer.close()
+	finally:
+		for (rows, future) in pending:
+			future.cancel()
+		executor.shutdown(wait = True)
@@ -0,0 +1,199 @@
+import json
+import sys
+from math import isinf, isnan
+
+try:
+	from urlparse import parse_qs
+except ImportError:
+	from urllib.parse import parse_qs
+
+CHARTS = ('PieChart', 'VerticalChart', 'HorizontalChart', 'VerticalComparativeBarChart', 'VerticalComparativeKnotChart')
+CONTENT_TYPES = {
+	'png': 'image/png',
+	'svg': 'image/svg+xml',
+	'pdf': 'application/pdf'
+}
+STATUS = {
+	200: '200 OK',
+	304: '304 Not Modified',
+	400: '400 Bad Request',
+	405: '405 Method Not Allowed',
+	413: '413 Request Entity Too Large'
+}
+
+def package():
+	return sys.modules[__package__ or __name__.rpartition('.')[0]]
+
+class RequestError(Exception):
+	def __init__(self, status, message):
+		Exception.__init__(self, message)
+		self.status = status
+
+def finite(value):
+	value = float(value)
+	if isnan(value) or isinf(value):
+		raise ValueError('Expected a finite number: %r' % value)
+	return value
+
+def parseQuery(query):
+	params = parse_qs(query, keep_blank_values = True)
+	spec = {}
+	for name in ('chart', 'title', 'format'):
+		if name in params:
+			spec[name] = params[name][-1]
+	for name in ('width', 'height', 'graphDepth', 'groupSize', 'compression'):
+		if name in params:
+			spec[name] = int(params[name][-1])
+	if 'font' in params or 'fontSize' in params:
+		spec['font'] = (params.get('font', ['Sans'])[-1], int(params.get('fontSize', [10])[-1]))
+	if 'chartRatio' in params:
+		spec['chartRatio'] = finite(params['chartRatio'][-1])
+	if 'group' in params:
+		spec['groups'] = params['group']
+	points = []
+	for point in params.get('point', ()):
+		(label, separator, value) = point.rpartition(':')
+		points.append((label, finite(value)))
+	spec['points'] = points
+	return spec
+
+def checkETag(header, etag):
+	if header is None:
+		return False
+	for candidate in header.split(','):
+		candidate = candidate.strip()
+		if candidate.startswith('W/'):
+			candidate = candidate[2:]
+		if candidate == '*' or candidate == etag:
+			return True
+	return False
+
+class ChartApplication(object):
+	maxWidth = 4096
+	maxHeight = 4096
+	maxBody = 1024 * 1024
+	maxAge = 300
+	chunkSize = 64 * 1024
+	maxDepth = 64
+	maxGroupSize = 64
+	maxFontSize = 256
+	maxPoints = 10000
+
+	def __init__(self, charts = None, renderCache = None, maxAge = None):
+		self.charts = charts
+		self.renderCache = renderCache
+		if maxAge is not None:
+			self.maxAge = maxAge
+
+	def chartClasses(self):
+		if self.charts is None:
+			self.charts = dict((name, getattr(package(), name)) for name in CHARTS)
+		return self.charts
+
+	def readSpec(self, environ):
+		method = environ.get('REQUEST_METHOD', 'GET')
+		if method in ('GET', 'HEAD'):
+			return parseQuery(environ.get('QUERY_STRING', ''))
+		if method != 'POST':
+			raise RequestError(405, 'Unsupported method: %s' % method)
+		length = int(environ.get('CONTENT_LENGTH') or 0)
+		if length > self.maxBody:
+			raise RequestError(413, 'Request body too large')
+		body = environ['wsgi.input'].read(length)
+		spec = json.loads(body.decode('utf-8'))
+		if not isinstance(spec, dict):
+			raise ValueError('Expected a JSON object')
+		return spec
+
+	def checkSpec(self, spec):
+		if not 0 <= int(spec.get('graphDepth', 0)) <= self.maxDepth:
+			raise ValueError('graphDepth must be between 0 and %d' % self.maxDepth)
+		if not 0 < int(spec.get('groupSize', 1)) <= self.maxGroupSize:
+			raise ValueError('groupSize must be between 1 and %d' % self.maxGroupSize)
+		if 'font' in spec and not 0 < int(spec['font'][1]) <= self.maxFontSize:
+			raise ValueError('fontSize must be between 1 and %d' % self.maxFontSize)
+		if 'chartRatio' in spec and not 0 < finite(spec['chartRatio']) <= 1:
+			raise ValueError('chartRatio must be between 0 and 1')
+		points = spec.get('points', ())
+		if len(points) > self.maxPoints or len(spec.get('groups', ())) > self.maxPoints:
+			raise ValueError('At most %d points and groups are supported' % self.maxPoints)
+		for point in points:
+			finite(point[1])
+
+	def buildChart(self, spec):
+		chartClass = self.chartClasses().get(spec.get('chart'))
+		if chartClass is None:
+			raise ValueError('Unknown chart: %s' % spec.get('chart'))
+		self.checkSpec(spec)
+		spec = dict(spec)
+		spec['chart'] = chartClass
+		chart = package().buildChart(spec)
+		if hasattr(chart, 'addGroup'):
+			if chart.groupSize < 1:
+				raise ValueError('groupSize must be positive')
+			if not chart.groups:
+				raise ValueError('%s requires at least one group' % spec['chart'].__name__)
+		if 'compression' in spec:
+			chart.setCompression(spec['compression'])
+		if self.renderCache is not None:
+			chart.setRenderCache(self.renderCache)
+		return chart
+
+	def headers(self, etag, format):
+		return [
+			('Content-Type', CONTENT_TYPES[format]),
+			('ETag', etag),
+			('Cache-Control', 'public, max-age=%d' % self.maxAge)
+		]
+
+	def stream(self, data):
+		try:
+			for offset in range(0, len(data), self.chunkSize):
+				yield data[offset:offset + self.chunkSize]
+		finally:
+			if hasattr(data, 'close'):
+				data.close()
+
+	def cached(self, chart, width, height, format):
+		if not hasattr(self.renderCache, 'open'):
+			return None
+		return self.renderCache.open(chart.cacheKey(width, height, format = format))
+
+	def __call__(self, environ, start_response):
+		try:
+			spec = self.readSpec(environ)
+			width = int(spec.get('width', 400))
+			height = int(spec.get('height', 300))
+			format = spec.get('format', 'png')
+			if format not in CONTENT_TYPES:
+				raise ValueError('Unsupported output format: %s' % format)
+			if not (0 < width <= self.maxWidth and 0 < height <= self.maxHeight):
+				raise ValueError('Unsupported size: %dx%d' % (width, height))
+			chart = self.buildChart(spec)
+		except RequestError as e:
+			return self.error(start_response, e.status, str(e))
+		except (ValueError, TypeError, KeyError) as e:
+			return self.error(start_response, 400, str(e))
+		etag = '"%s"' % chart.cacheKey(width, height, format = format)
+		headers = self.headers(etag, format)
+		if checkETag(environ.get('HTTP_IF_NONE_MATCH'), etag):
+			start_response(STATUS[304], headers[1:])
+			return []
+		data = self.cached(chart, width, height, format)
+		if data is None:
+			try:
+				data = chart.render(width, height, format = format)
+			except (ValueError, ZeroDivisionError) as e:
+				return self.error(start_response, 400, 'Cannot render chart: %s' % e)
+		headers.append(('Content-Length', str(len(data))))
+		start_response(STATUS[200], headers)
+		if environ.get('REQUEST_METHOD') == 'HEAD':
+			if hasattr(data, 'close'):
+				data.close()
+			return []
+		return self.stream(data)
+
+	def error(self, start_response, status, message):
+		body = message.encode('utf-8')
+		start_response(STATUS[status], [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', str(len(body)))])
+		return [body]